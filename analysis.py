@@ -1,42 +1,201 @@
+import argparse
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import datetime
+import hashlib
+import numpy as np
+import openpyxl
 import operator as op
 import os
 import pandas as pd
+import sqlite3
 import sys
+import tempfile
+import warnings
+
+from public_comment.matcher import KeywordMatcher
 
 PATH = os.path.dirname(__file__)
 
 KEYWORDS = ['abolish', 'defund', 'reform']
 PUNCTUATION = [',', '.', '"', "'", '?', '!', '(', ')', ':', ';', '\n']
+PUNCTUATION_TABLE = str.maketrans('', '', "".join(PUNCTUATION))
+KEY = ['directory', 'track']
+ROW_HASH = 'row hash'
+TEXT_HASH = 'text hash'
+KEYWORDS_VERSION = 'keywords version'
 SENTIMENTS = ['defund', 'reform', 'abolish', 'support', 'prison', 'communities', 'education', 'healthcare', 'other']
-sentiment_keywords = {
-    'defund': ['defund', 'defunding', 'divest', 'allocate', 'allocation', 'reallocate', 'reallocation', 'funds', 'funding', 'budget'],
-    'reform': ['reform', 'training'],
-    'abolish': ['abolish', 'dismantle'],
-    'support': ['blue'],
-    'prison': ['prison', 'prison', 'jail', 'jails'],
-    'communities': ['community', 'communities', 'social'],
-    'education': ['education', 'school', 'schools', 'teacher', 'teachers', 'teaching'], 
-    'healthcare': ['insurance', 'medical', 'healthcare', 'medicine', 'medication'],
-    'other': []
-}
+SCHEMA = os.path.join(PATH, 'public_comment', 'schema.sql')
+matcher = None  # set in each worker process by `_init_worker`
+
+
+def load_matcher() -> KeywordMatcher:
+    """
+    Returns the matcher compiled from the web app's keywords table, so the analysis and the form tag with the same keywords.
+    If the app's database can't be read or has no keywords, warns and uses the keywords schema.sql seeds new databases with.
+    """
+
+    try:
+        from public_comment import create_app
+        from public_comment.db import DataManager
+
+        with create_app().app_context():
+            shared = DataManager().get_matcher()
+        if shared.keywords:
+            return shared
+        reason = "it has no keywords"
+    except (ImportError, sqlite3.Error) as e:
+        reason = str(e)
+
+    warnings.warn(f"Couldn't read keywords from the app's database ({reason}); using the keywords in {SCHEMA}.")
+    db = sqlite3.connect(':memory:')
+    try:
+        with open(SCHEMA) as f:
+            db.executescript(f.read())
+        keywords = {}
+        for keyword, sentiment in db.execute("SELECT keyword_val, sentiment FROM keywords WHERE sentiment != '' ORDER BY sentiment, keyword_val"):
+            keywords.setdefault(sentiment, []).append(keyword)
+    finally:
+        db.close()
+
+    return KeywordMatcher(keywords)
+
+def _init_worker(shared:KeywordMatcher) -> None:
+    """
+    Installs the parent's matcher once in each worker process, so tasks only carry transcripts.
+    """
+
+    global matcher
+    matcher = shared
+
+def _tag_partition(transcripts:pd.Series) -> np.ndarray:
+    return matcher.tag(transcripts, SENTIMENTS)
+
+
+class TagStore:
+    """
+    Sidecar SQLite store of `Analyzer.update_level_0`'s state:
+        the hash of each (directory, track)'s input row, the tags `level_0` gave it with the hash of the transcript
+        and the keyword version they were computed from (none for rows the input already tagged),
+        and what the last run read and wrote.
+    """
+
+    layout = ",".join([ROW_HASH, TEXT_HASH, KEYWORDS_VERSION, *SENTIMENTS])
+
+    def __init__(self, file_path:str):
+        self.conn = sqlite3.connect(file_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS runs (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        if self.get('layout') != self.layout:
+            self.reset()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def reset(self) -> None:
+        """
+        Forgets every row, as when the sentiments or the stored columns change; the next run tags everything again.
+        """
+
+        sentiments = ", ".join(f"`{sentiment}` INTEGER" for sentiment in SENTIMENTS)
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS tags")
+            self.conn.execute(f"""
+                CREATE TABLE tags (
+                    directory TEXT NOT NULL,
+                    track INTEGER NOT NULL,
+                    `{ROW_HASH}` TEXT,
+                    `{TEXT_HASH}` TEXT,
+                    `{KEYWORDS_VERSION}` TEXT,
+                    {sentiments},
+                    PRIMARY KEY (directory, track)
+                ) WITHOUT ROWID""")
+            self.conn.execute("DELETE FROM runs")
+        self.set(layout=self.layout)
+
+    def get(self, name:str) -> str:
+        row = self.conn.execute("SELECT value FROM runs WHERE name = ?", (name,)).fetchone()
+
+        return row[0] if row else None
+
+    def set(self, **values) -> None:
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO runs (name, value) VALUES (?, ?)", values.items())
+
+    def load(self) -> pd.DataFrame:
+        """
+        Returns every stored row, indexed by (directory, track), with nullable boolean sentiments.
+        """
+
+        rows = pd.read_sql("SELECT * FROM tags", self.conn, index_col=KEY)
+        rows[SENTIMENTS] = rows[SENTIMENTS].astype('boolean')
+
+        return rows
+
+    def save(self, rows:pd.DataFrame, removed:pd.MultiIndex=None) -> None:
+        """
+        Stores `rows`, replacing any with the same (directory, track), and deletes the `removed` keys, in one transaction.
+        """
+
+        columns = [*KEY, ROW_HASH, TEXT_HASH, KEYWORDS_VERSION, *SENTIMENTS]
+        values = rows[columns].astype(object)
+        values = values.where(values.notna(), None).itertuples(index=False, name=None)
+        placeholders = ", ".join("?" * len(columns))
+        with self.conn:
+            self.conn.executemany(f"INSERT OR REPLACE INTO tags VALUES ({placeholders})", values)
+            if removed is not None:
+                self.conn.executemany("DELETE FROM tags WHERE directory = ? AND track = ?", ((directory, int(track)) for directory, track in removed))
 
 
 class Analyzer:
-    def __init__(self, file_path=None):
+    def __init__(self, file_path=None, header:int=0, workers:int=1, matcher:KeywordMatcher=None):
+        """
+        :param matcher: Matcher to tag transcripts with; defaults to the one `load_matcher` compiles from the app's keywords.
+        """
+
         self.file_path = self._verify_file_path(file_path)
+        self.header = header
+        self.workers = workers
+        self.matcher = matcher if matcher is not None else load_matcher()
+        self._pool = None
 
         self.extension_functions = {
             '.csv': {
                 'load': self.load_csv,
+                'iter': self.iter_csv,
                 'save': self.save_csv
             },
             '.xlsx': {
                 'load': self.load_xlsx,
+                'iter': self.iter_xlsx,
                 'save': self.save_xlsx
+            },
+            '.parquet': {
+                'load': self.load_parquet,
+                'save': self.save_parquet
+            },
+            '.feather': {
+                'load': self.load_feather,
+                'save': self.save_feather
             }
         }
 
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.matcher,))
+
+        return self._pool
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes, if any were started.
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
     def _verify_file_path(self, file_path:str) -> str:
         """
         Checks if the file indicated by `file_path` exists and if not,
@@ -46,7 +205,7 @@ class Analyzer:
         :return: File path.
         """
 
-        if not os.path.exists(file_path) and len(os.path.split(file_path) == 1):
+        if not os.path.exists(file_path) and not os.path.dirname(file_path):
             file_path = self._verify_file_path(os.path.join(PATH, file_path))
         elif not os.path.exists(file_path):
             raise FileExistsError
@@ -60,30 +219,169 @@ class Analyzer:
 
         extension = os.path.splitext(self.file_path)[1]
         func = self.extension_functions[extension]['load']
-        df = func(self.file_path)
+        df = func(self.file_path, header=self.header)
 
         return df
 
+    def load_file(self, file_path:str) -> pd.DataFrame:
+        """
+        Loads any file with a registered extension, e.g. a previous output, into a DataFrame.
+        """
+
+        extension = os.path.splitext(file_path)[1]
+        func = self.extension_functions[extension]['load']
+
+        return func(file_path)
+
+    def iter_table(self, chunksize:int):
+        """
+        Reads the data in `self.file_path` as a sequence of DataFrames of at most `chunksize` rows,
+            so only one chunk is held in memory at a time.
+        """
+
+        extension = os.path.splitext(self.file_path)[1]
+        func = self.extension_functions[extension]['iter']
+
+        return func(self.file_path, chunksize, header=self.header)
+
     @staticmethod
-    def load_xlsx(file_path:str) -> pd.DataFrame:
-            return pd.read_excel(file_path)
+    def load_xlsx(file_path:str, header:int=0) -> pd.DataFrame:
+            return pd.read_excel(file_path, header=header)
 
     @staticmethod
-    def load_csv(file_path:str) -> pd.DataFrame:
-        return pd.read_csv(file_path)
+    def load_csv(file_path:str, header:int=0) -> pd.DataFrame:
+        return pd.read_csv(file_path, header=header)
 
-    def save_table(self, data:pd.DataFrame, filename:str=None, file_extension:str=None) -> None:
-        extension = file_extension or os.path.splitext(self.file_path)[1]
-        func = self.extension_functions.get(extension)['save']
-        func(data, filename)
+    @staticmethod
+    def load_parquet(file_path:str, header:int=0) -> pd.DataFrame:
+        return pd.read_parquet(file_path)
 
     @staticmethod
-    def save_xlsx(data:pd.DataFrame, filename:str="public comment") -> None:
-            data.to_excel(".".join([filename, 'xlsx']))
+    def load_feather(file_path:str, header:int=0) -> pd.DataFrame:
+        return pd.read_feather(file_path)
 
     @staticmethod
-    def save_csv() -> None:
-        raise NotImplementedError
+    def iter_xlsx(file_path:str, chunksize:int, header:int=0):
+        """
+        Streams the first sheet of a workbook with openpyxl's read-only mode.
+        """
+
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            for _ in range(header):
+                next(rows, None)
+            columns = [col if col is not None else f"Unnamed: {idx}" for idx, col in enumerate(next(rows, ()))]
+
+            chunk = []
+            for row in rows:
+                if all(val is None for val in row):
+                    continue
+                chunk.append(row[:len(columns)])
+                if len(chunk) == chunksize:
+                    yield pd.DataFrame(chunk, columns=columns)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=columns)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def iter_csv(file_path:str, chunksize:int, header:int=0):
+        return pd.read_csv(file_path, header=header, chunksize=chunksize)
+
+    def save_table(self, data:pd.DataFrame, filename:str="public comment", file_extension:str=None, append:bool=False) -> None:
+        """
+        Writes `data` with the writer registered for the file's extension.
+        The extension is taken from `filename` if it has one, else `file_extension`, else the input file's.
+
+        :param append: Append to the file rather than replace it (CSV only).
+        """
+
+        file_path = self.output_path(filename, file_extension)
+        func = self.extension_functions[os.path.splitext(file_path)[1]]['save']
+        func(data, file_path, append=append)
+
+    def output_path(self, filename:str, file_extension:str=None) -> str:
+        """
+        Returns `filename` with an extension, defaulting to the input file's.
+        """
+
+        if os.path.splitext(filename)[1] in self.extension_functions:
+            return filename
+
+        return filename + (file_extension or os.path.splitext(self.file_path)[1])
+
+    @staticmethod
+    @contextmanager
+    def atomic_path(file_path:str):
+        """
+        Yields a temporary path beside `file_path` and moves it over `file_path` once the block succeeds,
+            so readers never see a partially written file.
+        """
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=os.path.splitext(file_path)[1])
+        os.close(fd)
+        try:
+            yield temp_path
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def save_xlsx(data:pd.DataFrame, file_path:str, append:bool=False) -> None:
+        if append:
+            raise ValueError("Excel workbooks can't be appended to; write a .csv instead.")
+
+        with Analyzer.atomic_path(file_path) as temp_path:
+            data.to_excel(temp_path, index=False)
+
+    @staticmethod
+    def save_csv(data:pd.DataFrame, file_path:str, append:bool=False) -> None:
+        if append and os.path.exists(file_path):
+            data.to_csv(file_path, mode='a', header=False, index=False)
+            return
+
+        with Analyzer.atomic_path(file_path) as temp_path:
+            data.to_csv(temp_path, index=False)
+
+    @staticmethod
+    def save_parquet(data:pd.DataFrame, file_path:str, append:bool=False) -> None:
+        if append:
+            raise ValueError("Parquet files can't be appended to; write a .csv instead.")
+
+        with Analyzer.atomic_path(file_path) as temp_path:
+            Analyzer.arrow_compatible(data).to_parquet(temp_path, index=False)
+
+    @staticmethod
+    def save_feather(data:pd.DataFrame, file_path:str, append:bool=False) -> None:
+        if append:
+            raise ValueError("Feather files can't be appended to; write a .csv instead.")
+
+        with Analyzer.atomic_path(file_path) as temp_path:
+            Analyzer.arrow_compatible(data).reset_index(drop=True).to_feather(temp_path)
+
+    @staticmethod
+    def arrow_compatible(data:pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns `data` with every object column holding a single Arrow type:
+            columns of only booleans (e.g. the sentiments) become nullable booleans,
+            and columns mixing types or holding times and durations (e.g. 'time', or 'other' where a location shares the sentiment's column) become strings.
+        """
+
+        data = data.copy()
+        for column in data.columns[data.dtypes == object]:
+            values = data[column].dropna()
+            types = set(values.map(type))
+            if not types:
+                continue
+            elif types <= {bool, np.bool_}:
+                data[column] = data[column].astype('boolean')
+            elif len(types) > 1 or types & {datetime.time, datetime.timedelta, pd.Timedelta}:
+                data[column] = data[column].map(str, na_action='ignore')
+
+        return data
 
     @staticmethod
     def replace_many(text:str, subs:dict) -> str:
@@ -109,37 +407,167 @@ class Analyzer:
         :return: Sanitized text.
         """
 
-        text = text.lower()
-        punct_dict = {punc: "" for punc in PUNCTUATION}
-        text = replace_many(text, punct_dict)
+        text = text.lower().translate(PUNCTUATION_TABLE)
 
         return text
 
-    def calc_level_0(self) -> None:
+    def calc_level_0(self, output:str="public_comment_lvl0") -> None:
         """
         Selects unexamined transcripts and applies a naïve, low-level analysis of the sentiment based on mere mention of any of the sentiment's keywords.
         """
 
-        data = self.load_table()
-        # unanalyzed = self._filter_df(data, filters={'entered by'}, func='isna')
-        unanalyzed = self._filter_df(data, filters={*SENTIMENTS}, func='isna')
+        data = self.level_0(self.load_table())
 
-        def lvl_0(row):
-            transcript = row['full text']
-            
-            sentiment_mentions = pd.Series(["?" * len(SENTIMENTS)])
-            if pd.notna(transcript):
-                sentiment_mentions = [self.check_mention(sentiment, transcript) for sentiment in SENTIMENTS]
+        self.save_table(data, output)
 
-            return pd.Series(sentiment_mentions)
+    def stream_level_0(self, output:str="public_comment_lvl0.csv", chunksize:int=1000) -> None:
+        """
+        Applies `calc_level_0`'s analysis one chunk of rows at a time,
+            appending each tagged chunk to the CSV file `output` so memory use stays bounded.
+        The chunks are written to a temporary file that replaces `output` once every chunk is tagged.
+        """
 
-        analyzed = unanalyzed.copy()
-        analyzed[SENTIMENTS] = unanalyzed.apply(lvl_0, axis=1)
-        analyzed['entered by'] = 'lvl_0'
+        output = self.output_path(output, '.csv')
+        with self.atomic_path(output) as temp_path:
+            for idx, chunk in enumerate(self.iter_table(chunksize)):
+                self.save_table(self.level_0(chunk), temp_path, append=bool(idx))
 
-        updated_df = self._update_df(data, analyzed)
+    def update_level_0(self, output:str="public_comment_lvl0.csv") -> None:
+        """
+        Incrementally applies `calc_level_0`'s analysis to `output`, keeping the hash of each input row,
+            and the tags of the rows it analyzed with the transcript hash and keyword version they came from, in a `TagStore` beside `output`.
+        As in `level_0`, only rows of the input without any sentiments are tagged, and of those only the ones that are new,
+            or whose transcript or keywords changed; the others reuse their stored tags.
+        If neither the input nor the keywords changed since the last run, nothing is read;
+            if every row that changed is new, they are appended to a CSV `output`;
+            otherwise `output` is rewritten from the input and the stored tags, without reading it back.
+        """
+
+        output = self.output_path(output, '.csv')
+        store = TagStore(self.store_path(output))
+        try:
+            digest = self.hash_file(self.file_path)
+            signature = self.file_signature(output)
+            if signature is not None and store.get('output') == signature and store.get('input') == digest and store.get('keywords') == self.matcher.version:
+                return
+
+            data = self.load_table()
+            data[ROW_HASH] = self.hash_texts(data)
+            data[TEXT_HASH] = self.hash_texts(data['full text'])
+            data[KEYWORDS_VERSION] = self.matcher.version
+            keyed = data[KEY].notna().all(axis=1)
+            keys = data.loc[keyed, KEY].astype({'directory': str, 'track': 'int64'})
+
+            data = data.reindex(columns=[*data.columns, *(sentiment for sentiment in SENTIMENTS if sentiment not in data.columns)])
+            unanalyzed = data[SENTIMENTS].isna().all(axis=1)
+            data.loc[~unanalyzed, [TEXT_HASH, KEYWORDS_VERSION]] = None
+
+            previous = store.load()
+            stored = keys.join(previous, on=KEY).reindex(data.index)
+            retag = unanalyzed & ((stored[TEXT_HASH] != data[TEXT_HASH]) | (stored[KEYWORDS_VERSION] != self.matcher.version))
+            reuse = unanalyzed & ~retag
+            changed = retag | (stored[ROW_HASH] != data[ROW_HASH])
+            removed = previous.index.difference(pd.MultiIndex.from_frame(keys))
+
+            data[SENTIMENTS] = data[SENTIMENTS].astype(object)
+            data.loc[reuse, SENTIMENTS] = stored.loc[reuse, SENTIMENTS].astype(object).to_numpy()
+            data.loc[retag, SENTIMENTS] = self.tag_level_0(data.loc[retag, 'full text']).astype(object)
+            data.loc[unanalyzed & data['full text'].notna(), 'entered by'] = 'lvl_0'
+
+            tagged = data.drop(columns=[ROW_HASH, TEXT_HASH, KEYWORDS_VERSION])
+            columns = ",".join(map(str, tagged.columns))
+            appendable = (
+                output.endswith('.csv') and signature is not None and store.get('output') == signature and store.get('columns') == columns
+                and keyed.all() and removed.empty and stored.loc[changed, ROW_HASH].isna().all()
+            )
+            if not appendable:
+                self.save_table(tagged, output)
+            elif changed.any():
+                self.save_table(tagged[changed], output, append=True)
+
+            stored_tags = data[SENTIMENTS].copy()
+            stored_tags.loc[~unanalyzed] = None
+            store.save(data.loc[changed & keyed, [ROW_HASH, TEXT_HASH, KEYWORDS_VERSION]].join(stored_tags).join(keys), removed)
+            store.set(input=digest, keywords=self.matcher.version, columns=columns, output=self.file_signature(output))
+        finally:
+            store.close()
+
+    @staticmethod
+    def store_path(output:str) -> str:
+        """
+        Returns the path of the `TagStore` kept beside `output`.
+        """
 
-        self.save_table(updated_df, "public_comment_lvl0")
+        return os.path.splitext(output)[0] + ".tags.sqlite"
+
+    @staticmethod
+    def hash_file(file_path:str) -> str:
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_signature(file_path:str) -> str:
+        """
+        Returns the size and modification time of `file_path`, to tell if it changed since it was written; None if it doesn't exist.
+        """
+
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    @staticmethod
+    def hash_texts(texts) -> pd.Series:
+        """
+        Returns a hexadecimal hash of each text, or of each row of a DataFrame, computed in one vectorized pass.
+        """
+
+        return pd.util.hash_pandas_object(texts.astype(object), index=False).map('{:016x}'.format)
+
+    def level_0(self, data:pd.DataFrame) -> pd.DataFrame:
+        """
+        Tags the rows of `data` that have no sentiments yet.
+
+        :param data: DataFrame with a 'full text' column.
+        :return: `data` with a column per sentiment.
+        """
+
+        data = data.reindex(columns=[*data.columns, *(sentiment for sentiment in SENTIMENTS if sentiment not in data.columns)])
+        unanalyzed = data[SENTIMENTS].isna().all(axis=1)
+
+        tags = self.tag_level_0(data.loc[unanalyzed, 'full text'])
+        data[SENTIMENTS] = data[SENTIMENTS].astype(object)
+        data.loc[unanalyzed, SENTIMENTS] = tags.astype(object)
+        data.loc[unanalyzed & data['full text'].notna(), 'entered by'] = 'lvl_0'
+
+        return data
+
+    def tag_level_0(self, transcripts:pd.Series) -> pd.DataFrame:
+        """
+        Tags each transcript with the sentiments it mentions.
+        With more than one worker, the transcripts are split into a partition per worker,
+            tagged in the process pool and reassembled in their original order.
+
+        :param transcripts: Series of transcripts.
+        :return: DataFrame of nullable booleans with a column per sentiment, NA where there is no transcript.
+        """
+
+        if self.workers > 1 and len(transcripts) >= self.workers:
+            partitions = [transcripts.iloc[idx] for idx in np.array_split(np.arange(len(transcripts)), self.workers)]
+            matrix = np.vstack(list(self.pool.map(_tag_partition, partitions)))
+        else:
+            matrix = self.matcher.tag(transcripts, SENTIMENTS)
+
+        tags = pd.DataFrame(matrix, index=transcripts.index, columns=SENTIMENTS).astype('boolean')
+        tags[transcripts.isna().to_numpy()] = pd.NA
+
+        return tags
 
     def calc_level_1(self):
         data = self.load_table()
@@ -161,16 +589,23 @@ class Analyzer:
 
         self.save_table(updated_df, "public_comment_lvl1")
 
-    @staticmethod
-    def check_mention(sentiment:str, transcript:str) -> bool:
+    def check_mention(self, sentiment:str, transcript:str) -> bool:
         """
         Checks if any of the `sentiment`'s keywords are present in the `trascript`.
         """
 
-        return any((keyword in transcript) for keyword in sentiment_keywords.get(sentiment))
+        return sentiment in self.matcher.mentions(transcript)
 
-    @staticmethod
-    def get_mention_context(sentiment:str, transcript:str) -> str:
+    def find_mentions(self, transcript:str) -> dict:
+        """
+        Scans the `transcript` once for the keywords of every sentiment.
+
+        :return: Dictionary of sentiments mentioned and the (start, end) offsets of their keywords.
+        """
+
+        return self.matcher.scan(transcript)
+
+    def get_mention_context(self, sentiment:str, transcript:str) -> str:
         """
         Hm...
 
@@ -180,7 +615,7 @@ class Analyzer:
 
         sentences = transcript.split(".")
         check = False
-        for keyword in sentiment_keywords.get(sentiment):
+        for keyword in (keyword for keyword, sentiments in self.matcher.keywords.items() if sentiment in sentiments):
             for sentence in sentences:
                 if check:
                     break
@@ -214,11 +649,25 @@ class Analyzer:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tags public comment transcripts with the sentiments they mention.")
+    parser.add_argument('filename', nargs='?', default='public comment.xlsx', help="Spreadsheet (.xlsx or .csv) of transcripts.")
+    parser.add_argument('--header', type=int, default=0, help="Row number to use as the column names.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--chunksize', type=int, help="Stream the spreadsheet this many rows at a time.")
+    mode.add_argument('--incremental', action='store_true', help="Only tag transcripts that are new or changed since the last incremental run, keeping its state beside the output.")
+    parser.add_argument('--output', default='public_comment_lvl0', help="File results are written to (.csv, .xlsx, .parquet or .feather); defaults to the input's format, or .csv when streaming or incremental.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to tag transcripts with.")
+    args = parser.parse_args()
+
+    analyzer = Analyzer(args.filename, header=args.header, workers=args.workers)
     try:
-        filename = sys.argv[1]
-    except IndexError:
-        filename = 'public comment.xlsx'
-    analyzer = Analyzer(filename)
-    analyzer.calc_level_0()
+        if args.chunksize:
+            analyzer.stream_level_0(args.output, chunksize=args.chunksize)
+        elif args.incremental:
+            analyzer.update_level_0(args.output)
+        else:
+            analyzer.calc_level_0(args.output)
+    finally:
+        analyzer.close()
     # analyzer.calc_level_1()
     print("done")
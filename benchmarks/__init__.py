@@ -0,0 +1,6 @@
+"""
+Benchmarks for the volunteer form and the analysis pipeline.
+
+    python -m benchmarks.run --rows 1000 10000 100000 --concurrency 4
+    python -m benchmarks.run --rows 1000 --compare benchmarks/results/<commit>.json
+"""
@@ -0,0 +1,252 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import multiprocessing
+import numpy as np
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import workbook
+
+PATH = os.path.dirname(os.path.abspath(__file__))
+DATA = os.path.join(PATH, 'data')
+RESULTS = os.path.join(PATH, 'results')
+
+
+def summarize(latencies:list, seconds:float=None, rows:int=None) -> dict:
+    """
+    Returns the count, p50/p99/mean latency in milliseconds and throughput of a list of latencies in seconds.
+
+    :param seconds: Wall time the operations took, if they overlapped; defaults to the sum of the latencies.
+    :param rows: Rows handled in total, if the operations handled rows rather than requests.
+    """
+
+    latencies = np.asarray(latencies)
+    seconds = float(latencies.sum()) if seconds is None else seconds
+    summary = {
+        'count': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'per_second': len(latencies) / seconds if seconds else None
+    }
+    if rows is not None:
+        summary['rows_per_second'] = rows / seconds if seconds else None
+
+    return summary
+
+
+def timed(func, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+
+    return time.perf_counter() - start, result
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process so far.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def drive(app, count:int, concurrency:int, send) -> dict:
+    """
+    Sends `count` requests through Flask test clients from `concurrency` threads.
+    Each thread's client keeps its own cookies, so it is a volunteer with its own session;
+        the client opens the form once before timing starts, to get that session.
+
+    :param send: Called as `send(client, idx)` to make the `idx`th request; returns the response.
+    :return: Summary of the latencies, with the number of responses that were errors.
+    """
+
+    def worker(worker_idx:int) -> tuple:
+        client = app.test_client()
+        client.get('/form/', follow_redirects=True)
+        latencies, errors = [], 0
+        for idx in range(worker_idx, count, concurrency):
+            latency, response = timed(send, client, idx)
+            latencies.append(latency)
+            errors += response.status_code >= 400
+
+        return latencies, errors
+
+    latencies, errors = [], 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        wall, results = timed(lambda: list(pool.map(worker, range(concurrency))))
+    for worker_latencies, worker_errors in results:
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+
+    summary = summarize(latencies, seconds=wall)
+    summary['errors'] = errors
+
+    return summary
+
+
+def bench_app(file_path:str, rows:int, workdir:str, requests:int, concurrency:int) -> dict:
+    """
+    Imports the workbook into a fresh database, then times the form's hot path.
+    """
+
+    from public_comment import create_app
+    from public_comment.const import COMMENTS, DIRECTORY, TRACK
+    from public_comment.db import DataManager
+    from public_comment.models import Comment
+    from public_comment.vox import vp
+
+    app = create_app({
+        'DATABASE': os.path.join(workdir, 'db.sqlite'),
+        'WORKBOOK': file_path,
+        'WORKBOOK_HEADER': workbook.HEADER,
+        'WORKBOOK_CACHE': os.path.join(workdir, 'workbooks.sqlite')
+    })
+    results = {}
+
+    with app.app_context():
+        dm = DataManager()
+        dm.init_db()
+        seconds, _ = timed(vp.load, file_path, header=workbook.HEADER)
+        results['import'] = {'seconds': seconds, 'rows_per_second': rows / seconds}
+        keys = [tuple(row) for row in dm.select(COMMENTS, columns=[DIRECTORY, TRACK])]
+
+    def form(client, idx:int):
+        return client.get('/form/')
+
+    def acknowledge(client, idx:int):
+        directory, track = keys[idx % len(keys)]
+        return client.post(f"/form/{directory}/{track}", data={
+            DIRECTORY: directory,
+            TRACK: track,
+            'entered_by': 'benchmark',
+            'caller': 'Caller, Benchmark',
+            'intent': 'Other',
+            'notes': 'benchmark'
+        })
+
+    app.test_client().get('/form/', follow_redirects=True)  # warm up caches and compiled matchers
+    results['form_get'] = drive(app, requests, concurrency, form)
+    results['acknowledge_post'] = drive(app, requests, concurrency, acknowledge)
+    with app.app_context():
+        seconds, _ = timed(vp.buffer.flush)
+        results['acknowledge_flush'] = {'seconds': seconds}
+
+        latencies = [timed(dm.select, COMMENTS, where={DIRECTORY: key[0], TRACK: key[1]}, datatype=Comment)[0] for key in keys[:requests]]
+        results['select_comment'] = summarize(latencies)
+        seconds, comments = timed(dm.select, COMMENTS, datatype=Comment)
+        results['select_all'] = {'seconds': seconds, 'rows_per_second': len(comments) / seconds}
+
+    return results
+
+
+def bench_analyzer(file_path:str, rows:int, workdir:str) -> dict:
+    """
+    Times loading, tagging and saving a workbook with `Analyzer`.
+    """
+
+    import analysis
+
+    analyzer = analysis.Analyzer(file_path, header=workbook.HEADER)
+    results = {}
+    try:
+        seconds, data = timed(analyzer.load_table)
+        results['analyzer_load'] = {'seconds': seconds, 'rows_per_second': rows / seconds}
+        seconds, _ = timed(analyzer.level_0, data)
+        results['analyzer_level_0'] = {'seconds': seconds, 'rows_per_second': rows / seconds}
+        seconds, _ = timed(analyzer.calc_level_0, os.path.join(workdir, 'public_comment_lvl0.csv'))
+        results['analyzer_calc_level_0'] = {'seconds': seconds, 'rows_per_second': rows / seconds}
+    finally:
+        analyzer.close()
+
+    return results
+
+
+def run_size(rows:int, requests:int, concurrency:int, seed:int) -> dict:
+    """
+    Runs every benchmark against a workbook of `rows` comments.
+    Meant to run in its own process, so the peak RSS is that of this size alone.
+    """
+
+    file_path = os.path.join(DATA, f"full-council-{rows}-{seed}.xlsx")
+    results = {}
+    if not os.path.exists(file_path):
+        seconds, _ = timed(workbook.generate, file_path, rows, seed)
+        results['generate'] = {'seconds': seconds}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results.update(bench_app(file_path, rows, workdir, requests, concurrency))
+        results.update(bench_analyzer(file_path, rows, workdir))
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    return results
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results:dict, baseline:dict) -> None:
+    """
+    Prints how each timing in `results` changed from `baseline`.
+    """
+
+    print(f"{'rows':>8} {'benchmark':<24} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>8}")
+    for rows, benchmarks in results['sizes'].items():
+        for name, metrics in benchmarks.items():
+            if not isinstance(metrics, dict):
+                metrics = {'value': metrics}
+            for metric, value in metrics.items():
+                before = baseline['sizes'].get(rows, {}).get(name)
+                before = before.get(metric) if isinstance(before, dict) else before if metric == 'value' else None
+                if metric in ('count', 'errors') or value is None or not before:
+                    continue
+                print(f"{rows:>8} {name:<24} {metric:<16} {before:>12.3f} {value:>12.3f} {(value - before) / before:>+8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the volunteer form and the analysis pipeline against synthetic Full Council workbooks.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000], help="Workbook sizes to benchmark, e.g. 1000 10000 100000.")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per form benchmark.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Threads sending requests at once.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic transcripts.")
+    parser.add_argument('--output', help="JSON file to write results to; defaults to benchmarks/results/<commit>.json.")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    results = {
+        'commit': commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'sizes': {}
+    }
+
+    context = multiprocessing.get_context('spawn')
+    for rows in args.rows:
+        with context.Pool(1) as pool:
+            results['sizes'][str(rows)] = pool.apply(run_size, (rows, args.requests, args.concurrency, args.seed))
+        print(f"{rows} rows: {json.dumps(results['sizes'][str(rows)], indent=2)}")
+
+    output = args.output or os.path.join(RESULTS, f"{results['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
@@ -0,0 +1,117 @@
+import argparse
+import datetime
+import openpyxl
+import os
+import random
+
+HEADER = 2
+COLUMNS = ['directory', 'track', 'time', 'overall time', 'link', 'filename', 'otter timestamp', 'entered_by', 'caller', 'county', 'city', 'neighborhood', 'district', 'CM', 'zone', 'NPU', 'ZIP', 'address', 'Atlanta', 'other', 'topic', 'intent', 'full text', 'edited text']
+TRACKS_PER_DIRECTORY = 500
+
+INTENTS = ["For Police (Support Budget)", "Defund Police (Amend Budget)", "Other"]
+TOPICS = ['police budget', 'HOPWA', 'airport', 'NotifyATL', 'zoning']
+NEIGHBORHOODS = ['Ansley Park', 'Boulder Park', 'Buckhead', 'Grant Park', 'Kirkwood', 'Midtown', 'Old Fourth Ward', 'West End']
+NPUS = ['A', 'B', 'E', 'F', 'M', 'N', 'T', 'W']
+FIRST_NAMES = ['Lisa', 'Patrick', 'Melissa', 'Jennifer', 'Brenda', 'Sherry', 'Kevin', 'Andre', 'Maria', 'Tom']
+LAST_NAMES = ['Garvin', 'Pickens', 'Campbell', 'Abood', 'House', 'Williams', 'Nguyen', 'Jackson', 'Smith', 'Lee']
+VOLUNTEERS = ['Kyle', 'Dana', 'Sam']
+
+# common words, with the analysis and form keywords mixed in so tagging and highlighting find matches
+WORDS = (
+    "the a and to of in that is for it we our my i you this on are be have not with as they "
+    "city council members department people residents money year every vote please thank hello "
+    "name live district neighborhood family children safety services housing health support "
+    "afford arrest civil community criminal defund defunding dismantle homeless jail police policing "
+    "prison private property public reallocate reform replace school training victim zone budget "
+    "funds funding divest abolish blue education teachers insurance medical healthcare social"
+).split()
+
+
+def transcript(rng:random.Random) -> str:
+    """
+    Returns a made-up call-in transcript of a few sentences.
+    """
+
+    sentences = []
+    for _ in range(rng.randint(3, 12)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 20))]
+        sentences.append(" ".join(words).capitalize() + rng.choice(['.', '.', '.', '?', '!']))
+
+    return f"Hello, my name is {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}. " + " ".join(sentences)
+
+
+def rows(count:int, seed:int=0):
+    """
+    Yields `count` rows in the column order of the Full Council sheet.
+    Most comments are unentered, as they are when a meeting's calls are first imported.
+    """
+
+    rng = random.Random(seed)
+    elapsed = 0
+    for idx in range(count):
+        track = idx % TRACKS_PER_DIRECTORY + 1
+        if track == 1:
+            elapsed = 0
+        length = rng.randint(20, 180)
+        entered = rng.random() < 0.2
+        full_text = transcript(rng)
+
+        yield [
+            f"FC-{idx // TRACKS_PER_DIRECTORY + 1}",
+            track,
+            datetime.timedelta(seconds=elapsed),
+            datetime.time(*divmod(elapsed // 60 % 1440, 60)),
+            f"https://otter.ai/s/benchmark?t={elapsed}s",
+            f"VoiceMessage ({track - 1})" if track > 1 else "VoiceMessage",
+            datetime.time(*divmod(elapsed // 60 % 1440, 60)),
+            rng.choice(VOLUNTEERS) if entered else None,
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'Fulton' if entered else None,
+            'Atlanta' if entered else None,
+            rng.choice(NEIGHBORHOODS) if entered else None,
+            rng.randint(1, 12) if entered else None,
+            None,
+            rng.randint(1, 6) if entered else None,
+            rng.choice(NPUS) if entered else None,
+            rng.randint(30303, 30342) if entered else None,
+            None,
+            True if entered else None,
+            None,
+            rng.choice(TOPICS) if entered else None,
+            rng.choice(INTENTS) if entered else None,
+            full_text,
+            full_text if entered and rng.random() < 0.5 else None
+        ]
+        elapsed += length
+
+
+def generate(file_path:str, count:int, seed:int=0) -> str:
+    """
+    Writes a workbook of `count` synthetic comments laid out like the 'comment data' sheet of the Full Council workbook:
+        two banner rows, the column names on row `HEADER`, then a row per comment.
+
+    :return: `file_path`.
+    """
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('comment data')
+    sheet.append(['audio information', *[None] * 8, 'location information'])
+    sheet.append([None] * len(COLUMNS))
+    sheet.append(COLUMNS)
+    for row in rows(count, seed):
+        sheet.append(row)
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    workbook.save(file_path)
+
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a synthetic Full Council workbook.")
+    parser.add_argument('rows', type=int, help="Number of comments.")
+    parser.add_argument('output', help="Path of the .xlsx file to write.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.output, args.rows, args.seed)
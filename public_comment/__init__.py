@@ -1,19 +1,47 @@
 from flask import Flask
 import os
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
 
     app.config.from_mapping(
         SECRET_KEY='dev',
-        DATABASE=os.path.join(app.instance_path, 'db.sqlite')
+        DATABASE=os.path.join(app.instance_path, 'db.sqlite'),
+        SQLITE_JOURNAL_MODE='WAL',
+        SQLITE_SYNCHRONOUS='NORMAL',
+        SQLITE_MMAP_SIZE=64 * 1024 * 1024,
+        SQLITE_CACHE_SIZE=-16 * 1024,
+        SQLITE_CACHED_STATEMENTS=256,
+        WORKBOOK=os.path.join(app.instance_path, 'Full Council 2020-07-06.xlsx'),
+        WORKBOOK_HEADER=2,
+        WORKBOOK_CACHE=os.path.join(app.instance_path, 'workbooks.sqlite'),
+        WRITE_BUFFER_SIZE=50,
+        WRITE_BUFFER_INTERVAL=2.0,
+        UPLOAD_DIR=os.path.join(app.instance_path, 'uploads'),
+        INGEST_WORKERS=1,
+        QUEUE_LEASE=15 * 60,
+        REFERENCE_TTL=60,
+        KEYWORDS_TTL=10,
+        USER_CACHE_TTL=60,
+        METRICS=True,
+        SLOW_QUERY_THRESHOLD=None,
+        PROFILING=False,
+        PROFILING_ADMINS=[],
+        PROFILE_DIR=os.path.join(app.instance_path, 'profiles'),
+        PROFILE_TOP=40
     )
 
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+
     try:
         os.makedirs(app.instance_path)
     except OSError:
         pass
 
+    from public_comment.metrics import metrics
+    metrics.init_app(app)
+
     from public_comment import db
     db.DataManager.init_app(app)
 
@@ -23,4 +51,7 @@ def create_app():
     import public_comment.vox
     app.register_blueprint(vox.bp)
 
+    from public_comment import profiling
+    profiling.init_app(app)
+
     return app
\ No newline at end of file
@@ -1,13 +1,49 @@
-from flask import Blueprint, flash, g, redirect, render_template, request, session, url_for
+from flask import Blueprint, current_app, flash, g, redirect, render_template, request, session, url_for
 import functools
+import threading
+import time
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from public_comment.const import *
 from public_comment.db import DataManager
 from public_comment import models
 
+class UserCache:
+    """
+    Per-process cache of users keyed by user id, so loading the logged-in user
+        doesn't query the database on every request.
+    Entries expire after USER_CACHE_TTL seconds to pick up changes made by other workers.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id:int):
+        """
+        Returns the user row for `user_id`, or None if there is no such user.
+        """
+
+        now = time.monotonic()
+        cached = self._users.get(user_id)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        users = dm.select(USERS, where={USER_ID: user_id})
+        user = users[0] if users else None
+        with self._lock:
+            self._users[user_id] = (user, now + current_app.config['USER_CACHE_TTL'])
+
+        return user
+
+    def forget(self, user_id:int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
 bp = Blueprint(AUTH, __name__, url_prefix='/auth')
 dm = DataManager()
+users = UserCache()
 
 @bp.route('/register/', methods=(GET, POST))
 def register():
@@ -26,6 +62,7 @@ def register():
         if not error:
             dm.insert(USERS, values=new_user.to_dict())
             user = dm.select(USERS, where={USER_VAL: new_user.username}, datatype=models.User)[0]
+            users.forget(user[USER_ID])
             session.clear()
             session[USER_ID] = user[USER_ID]
             return redirect(url_for('vox.index'))
@@ -49,6 +86,7 @@ def login():
             error = "Password is incorrect."
 
         if not error:
+            users.forget(user[USER_ID])
             session.clear()
             session[USER_ID] = user[USER_ID]
             return redirect(url_for('vox.index'))
@@ -59,17 +97,23 @@ def login():
 
 @bp.route('/logout')
 def logout():
+    users.forget(session.get(USER_ID))
     session.clear()
     return redirect(url_for('vox.index'))
 
 @bp.before_app_request
 def load_logged_in_user():
-    user_id = session.get(USER_ID, -1)
-    
-    try:
-        g.user = dm.select('users', where={USER_ID: user_id})[0]
-    except IndexError:
+    """
+    Loads the logged-in user from the cache.
+    Anonymous sessions and static files skip the lookup.
+    """
+
+    user_id = session.get(USER_ID)
+
+    if user_id is None or request.endpoint == 'static':
         g.user = None
+    else:
+        g.user = users.get(user_id)
  
 def login_required(view):
     @functools.wraps(view)
@@ -1,7 +1,11 @@
 # tables
+COMMENTS = 'comments'
 DISTRICTS = 'districts'
+JOBS = 'jobs'
+KEYWORDS = 'keywords'
 NEIGHBORHOODS = 'neighborhoods'
 NPUs = 'npus'
+QUEUE = 'queue'
 USERS = 'users'
 ZONES = 'zones'
 
@@ -16,11 +20,31 @@ DISTRICT_ID = 'district_id'
 ZONE_ID = 'zone_id'
 NPU_ID = 'npu_id'
 
+CLAIMED_BY = 'claimed_by'
+LEASE_EXPIRES = 'lease_expires'
+CLAIMANT = 'claimant'
+
+KEYWORD_VAL = 'keyword_val'
+SENTIMENT = 'sentiment'
+
+JOB_ID = 'job_id'
+STATUS = 'status'
+PROGRESS = 'progress'
+
 # model attributes
 DIRECTORY = 'directory'
+EDITED_TEXT = 'edited_text'
 ENTERED_BY = 'entered_by'
+FULL_TEXT = 'full_text'
 TRACK = 'track'
 
+# job statuses
+QUEUED = 'queued'
+PARSING = 'parsing'
+IMPORTING = 'importing'
+DONE = 'done'
+FAILED = 'failed'
+
 # HTTP
 GET = 'GET'
 POST = 'POST'
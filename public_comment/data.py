@@ -1,17 +1,357 @@
-from flask import g
-import operator as op
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, Flask, g
+import hashlib
+import io
+import os
 import pandas as pd
+import sqlite3
+import threading
+import uuid
+from werkzeug.utils import secure_filename
 
 from public_comment.const import *
+from public_comment.db import DataManager
+from public_comment.metrics import metrics
 from public_comment.models import Comment
 
+def storable(df:pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of `df` with the values SQLite cannot store natively (e.g. `datetime.time`) as strings.
+    """
+
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda val: val if val is None or isinstance(val, (str, int, float)) else str(val))
+
+    return df
+
+
+class WorkbookCache:
+    """
+    Stores parsed spreadsheets as tables in a SQLite file, keyed by the hash of the workbook's contents,
+    so a workbook is only ever parsed by openpyxl once.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    source_path TEXT PRIMARY KEY,
+                    mtime INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sheets (
+                    sheet_val TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    header INTEGER NOT NULL
+                );""")
+
+        return self._conn
+
+    def load(self, file, header:int=0) -> pd.DataFrame:
+        """
+        Returns the DataFrame for `file`, parsing it only if its contents have not been cached yet.
+
+        :param file: Path to a workbook or a file-like object.
+        :param header: Row number to use as the column names.
+        :return: DataFrame of the first sheet.
+        """
+
+        with self._lock:
+            return self._load(file, header)
+
+    def _load(self, file, header:int=0) -> pd.DataFrame:
+        if isinstance(file, str):
+            digest = self.path_digest(file)
+        else:
+            data = file.read()
+            digest = hashlib.sha1(data).hexdigest()
+            file = io.BytesIO(data)
+
+        header = int(header)
+        sheet_val = f"sheet_{digest}_{header}"
+        if not self.conn.execute("SELECT 1 FROM sheets WHERE sheet_val = ?", (sheet_val,)).fetchone():
+            with metrics.span('workbook_parse'):
+                df = VoxPopuli.read_xlsx(file, header)
+            self.store(sheet_val, df)
+            self.conn.execute("INSERT OR REPLACE INTO sheets (sheet_val, digest, header) VALUES (?, ?, ?)", (sheet_val, digest, header))
+            self.conn.commit()
+
+        with metrics.span('workbook_load'):
+            return pd.read_sql_query(f'SELECT * FROM "{sheet_val}"', self.conn)
+
+    def path_digest(self, file_path:str) -> str:
+        """
+        Returns the content hash of the file at `file_path`.
+        The file is only re-hashed when its mtime or size has changed since it was last seen;
+            if its contents changed, the stale cached sheets are dropped.
+        """
+
+        stat = os.stat(file_path)
+        source_path = os.path.abspath(file_path)
+        cached = self.conn.execute("SELECT mtime, size, digest FROM sources WHERE source_path = ?", (source_path,)).fetchone()
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        with open(file_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+
+        if cached and cached[2] != digest:
+            self.drop(cached[2])
+        self.conn.execute("INSERT OR REPLACE INTO sources (source_path, mtime, size, digest) VALUES (?, ?, ?, ?)", (source_path, stat.st_mtime_ns, stat.st_size, digest))
+        self.conn.commit()
+
+        return digest
+
+    def store(self, sheet_val:str, df:pd.DataFrame) -> None:
+        """
+        Writes `df` to the `sheet_val` table.
+        Values SQLite cannot store natively (e.g. `datetime.time`) are kept as strings.
+        """
+
+        storable(df).to_sql(sheet_val, self.conn, if_exists='replace', index=False)
+
+    def drop(self, digest:str) -> None:
+        """
+        Removes every cached sheet parsed from the workbook with `digest`,
+            unless another source still points at it.
+        """
+
+        if self.conn.execute("SELECT COUNT(*) FROM sources WHERE digest = ?", (digest,)).fetchone()[0] > 1:
+            return
+
+        for (sheet_val,) in self.conn.execute("SELECT sheet_val FROM sheets WHERE digest = ?", (digest,)).fetchall():
+            self.conn.execute(f'DROP TABLE IF EXISTS "{sheet_val}"')
+        self.conn.execute("DELETE FROM sheets WHERE digest = ?", (digest,))
+
+
+class WriteBuffer:
+    """
+    Holds comment edits in memory and writes them to the comments table in batches:
+        once `size` comments are pending, `interval` seconds after the first pending edit, and at exit.
+    Repeated edits to the same comment are merged, so only the latest values are written.
+    """
+
+    def __init__(self, app:Flask, size:int=50, interval:float=2.0):
+        self.app = app
+        self.size = size
+        self.interval = interval
+        self.dm = DataManager()
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        # held from taking the pending edits until they're written, so an older batch never commits after a newer one
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+        atexit.register(self.flush)
+
+    def put(self, values:dict) -> None:
+        """
+        Queues the column `values` of a comment to be written.
+        """
+
+        key = (values[DIRECTORY], values[TRACK])
+        with self._lock:
+            pending = self._pending.setdefault(key, {})
+            pending.update({col: val for col, val in values.items() if val is not None})
+
+            full = len(self._pending) >= self.size
+            if not full:
+                self._schedule()
+
+        if full:
+            self.flush()
+
+    def _schedule(self) -> None:
+        """
+        Starts the timer that flushes the buffer, unless it's already running; call while holding the lock.
+        """
+
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def keys(self) -> set:
+        with self._lock:
+            return set(self._pending)
+
+    def get(self, directory:str, track:int) -> dict:
+        """
+        Returns the edits waiting to be written for the comment keyed by (`directory`, `track`).
+        """
+
+        with self._lock:
+            return dict(self._pending.get((directory, track), {}))
+
+    def flush(self) -> None:
+        """
+        Writes every pending edit in a single transaction.
+        If the write fails, the edits are put back, beneath any made since, and retried after `interval` seconds.
+        Flushes run one at a time.
+        """
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not pending:
+                return
+
+            try:
+                with self.app.app_context():
+                    self.dm.update_comments(list(pending.values()))
+            except Exception:
+                self.app.logger.exception("Failed to write %d buffered comment edits; retrying in %s seconds.", len(pending), self.interval)
+                with self._lock:
+                    for key, values in pending.items():
+                        self._pending[key] = {**values, **self._pending.get(key, {})}
+                    self._schedule()
+
+
+class Ingester:
+    """
+    Imports uploaded workbooks in background threads.
+    Each upload is saved to disk and tracked as a job in the jobs table, whose status and progress
+        are updated as the job moves through its stages: queued, parsing, importing, then done or failed.
+    """
+
+    def __init__(self, app:Flask, vox, workers:int=1):
+        """
+        :param vox: VoxPopuli the workbooks are imported into.
+        """
+
+        self.app = app
+        self.vox = vox
+        self.dm = DataManager()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+
+    def submit(self, file, header:int=0) -> str:
+        """
+        Saves the uploaded `file` under UPLOAD_DIR and queues it for import.
+
+        :param file: Uploaded file (werkzeug `FileStorage`).
+        :param header: Row number of the column names.
+        :return: Id of the job.
+        :raises ValueError: If `header` isn't a row number; nothing is saved.
+        """
+
+        if not str(header).strip().isdigit():
+            raise ValueError(f"The header must be a row number, 0 or more, not {header!r}.")
+        header = int(header)
+
+        job_id = uuid.uuid4().hex
+        extension = os.path.splitext(secure_filename(file.filename or ''))[1] or '.xlsx'
+        file_path = os.path.join(self.app.config['UPLOAD_DIR'], f"{job_id}{extension}")
+
+        os.makedirs(self.app.config['UPLOAD_DIR'], exist_ok=True)
+        file.save(file_path)
+
+        self.dm.create_job(job_id, file_path, header)
+        self.executor.submit(self.run, job_id, file_path, header)
+
+        return job_id
+
+    def run(self, job_id:str, file_path:str, header:int) -> None:
+        with self.app.app_context():
+            try:
+                self.dm.update_job(job_id, PARSING, 0.1)
+                # parsed directly rather than through the workbook cache, which would keep every upload for good
+                with metrics.span('workbook_parse'):
+                    df = self.vox.read_xlsx(file_path, header)
+
+                self.dm.update_job(job_id, IMPORTING, 0.6, rows=len(df))
+                self.vox.import_table(df, merge=True)
+
+                self.dm.update_job(job_id, DONE, 1.0)
+            except Exception as e:
+                self.app.logger.exception("Import of upload %s failed", job_id)
+                self.dm.update_job(job_id, FAILED, 1.0, message=str(e))
+            finally:
+                os.remove(file_path)
+
+
 class VoxPopuli:
+    """
+    Imports and exports the spreadsheet of call-in transcripts;
+        the comments themselves live in the database's comments table.
+    """
+
+    # workbook column -> comments table column
+    columns = {
+        'directory': DIRECTORY,
+        'track': TRACK,
+        'time': 'time',
+        'overall time': 'overall_time',
+        'link': 'link',
+        'filename': 'filename',
+        'otter timestamp': 'otter_timestamp',
+        'entered_by': ENTERED_BY,
+        'caller': 'caller',
+        'county': 'county',
+        'city': 'city',
+        'neighborhood': 'neighborhood',
+        'district': 'district',
+        'CM': 'councilor',
+        'zone': 'zone',
+        'NPU': 'npu',
+        'ZIP': 'zip',
+        'address': 'street',
+        'Atlanta': 'Atlanta',
+        'other': 'other_location',
+        'topic': 'topic',
+        'intent': 'intent',
+        'full text': FULL_TEXT,
+        'edited text': EDITED_TEXT
+    }
+
     def __init__(self):
-        self._table = None
+        self.dm = DataManager()
+        self._cache = None
+        self._buffer = None
+        self._ingester = None
+
+    @property
+    def cache(self) -> WorkbookCache:
+        if self._cache is None:
+            self._cache = WorkbookCache(current_app.config['WORKBOOK_CACHE'])
+
+        return self._cache
 
     @property
-    def table(self):
-        return self._table
+    def buffer(self) -> WriteBuffer:
+        if self._buffer is None:
+            self._buffer = WriteBuffer(
+                current_app._get_current_object(),
+                size=current_app.config['WRITE_BUFFER_SIZE'],
+                interval=current_app.config['WRITE_BUFFER_INTERVAL']
+            )
+
+        return self._buffer
+
+    @property
+    def ingester(self) -> Ingester:
+        if self._ingester is None:
+            self._ingester = Ingester(current_app._get_current_object(), self, workers=current_app.config['INGEST_WORKERS'])
+
+        return self._ingester
+
+    @property
+    def table(self) -> pd.DataFrame:
+        return self.export_table()
 
     @table.setter
     def table(self, obj):
@@ -19,80 +359,90 @@ class VoxPopuli:
             sheet = obj.get('sheet')
             header = obj.get('header', 0)
 
-        self._table = self.read_xlsx(sheet, header)
+        self.import_table(self.cache.load(sheet, header), merge=True)
 
-    def update_table(self, comment:Comment) -> None:
+    def upload(self, file, header:int=0) -> str:
         """
+        Imports an uploaded workbook in the background, adding its new comments and filling in what existing ones lack.
+        The comments appear all at once when the import finishes.
+
+        :return: Id of the import job.
+        """
+
+        return self.ingester.submit(file, header)
+
+    def load(self, sheet:str, header:int=0) -> None:
+        """
+        Seeds the comments table from the workbook at `sheet` if it is empty.
         """
 
-        self.table.set_index([DIRECTORY, TRACK], inplace=True)
-        self.table.loc[comment.directory, comment.track]
+        if not self.dm.count_comments():
+            self.import_table(self.cache.load(sheet, header))
 
-        comment_dict = comment.to_dict(flat=True)
-        comment_series = pd.Series(comment_dict)
+    def import_table(self, df:pd.DataFrame, merge:bool=False) -> None:
+        """
+        Imports the rows of a transcript workbook into the comments table.
 
+        :param df: DataFrame with the workbook's columns.
+        :param merge: Fill in the columns comments that already exist lack, keeping the values they have.
+        """
 
-        self.table.reset_index()
+        df = storable(df[[col for col in self.columns if col in df.columns]].dropna(subset=['directory', 'track']))
+        df = df.astype(object).where(df.notna(), None)
+        df['track'] = df['track'].map(int)
 
-        pass
+        self.dm.import_comments([self.columns[col] for col in df.columns], df.itertuples(index=False, name=None), merge=merge)
 
-    def get_series(self, table:pd.DataFrame=None, directory:str=None, track:int=None) -> pd.Series:
-        series = pd.Series()
-        df = table
+    def export_table(self) -> pd.DataFrame:
+        """
+        Returns the comments table as a DataFrame with the workbook's columns.
+        """
+
+        self.buffer.flush()
+        df = pd.read_sql_query(f"SELECT * FROM {COMMENTS} ORDER BY {DIRECTORY}, {TRACK}", self.dm.get_db())
+        df = df.rename(columns={col: name for name, col in self.columns.items()})
+
+        return df
+
+    def get_comment(self, directory:str=None, track:int=None, claimant:str=None) -> Comment:
+        """
+        Returns the comment keyed by (`directory`, `track`) if provided,
+            else leases the next unentered comment to `claimant` (or, without a claimant, shows it without leasing it),
+            else any comment once all have been entered.
+        """
 
-        if isinstance(table, pd.DataFrame) and table.empty:
-            df = self.table
-        if df is not None:
-            if directory and track:
-                try:
-                    series = self._filter_df(df, filters={DIRECTORY: directory, TRACK: track}).iloc[0]
-                except IndexError:
-                    pass
+        if not (directory and track):
+            if claimant is None:
+                key = self.dm.peek_comment()
             else:
-                unaccounted_df = self._filter_df(df, filters=[ENTERED_BY], func='isna')
-                if unaccounted_df.empty:
-                    unaccounted_df = df
-                series = unaccounted_df.sample(1).iloc[0]
+                key = self.dm.claim_comment(claimant, current_app.config['QUEUE_LEASE'], exclude=self.buffer.keys())
+            if key is None:
+                return self.dm.get_random_comment()
+            directory, track = key
 
-        return series
+        pending = self.buffer.get(directory, track)
+        if not pending:
+            return self.dm.get_comment(directory, track)
 
-    @staticmethod
-    def read_xlsx(file, header:int=0) -> pd.DataFrame:
-        return pd.read_excel(file, header=int(header))
+        rows = self.dm.select(COMMENTS, where={DIRECTORY: directory, TRACK: track})
+        return Comment.from_dict({**rows[0].to_dict(), **pending}) if rows else None
 
-    @staticmethod
-    def _filter_df(df, filters:dict, exclude=False, func='isin'):
-        """
-        """
-
-        funcs = {
-            'isin': pd.Series.isin,
-            'df_isin': pd.DataFrame.isin,
-            'isna': pd.Series.isna,
-            'df_isna': pd.DataFrame.isna,
-            'notna': pd.Series.notna,
-            'df_notna': pd.DataFrame.notna
-        }
-
-        vert = op.inv if exclude or 'not ' in str(func) else op.pos
-        func = funcs.get(func, func)
-
-        if isinstance(filters, dict):
-            for col, val in filters.items():
-                if is_iter(col):
-                    col = list(col)
-                    func = funcs(f"df_{func.__name__}", func)
-                if not is_iter(val):
-                    val = [val]
-                df = df[vert(func(df[col], val))]
-        elif hasattr(filters, "__iter__"):
-            for col in filters:
-                if is_iter(col):
-                    col = list(col)
-                    func = funcs(f"df_{func.__name__}", func)
-                df = df[vert(func(df[col]))]
+    def release(self, directory:str, track:int, claimant:str) -> None:
+        """
+        Gives up `claimant`'s lease on a comment so another volunteer can claim it.
+        """
 
-        return df
+        self.dm.release_comment(directory, track, claimant)
 
-def is_iter(obj) -> bool:
-    return hasattr(obj, '__iter__') and not isinstance(obj, str)
+    def update_table(self, comment:Comment) -> None:
+        """
+        Queues the edits in `comment` to be written to the comments table
+            and takes the comment off the work queue, whether or not the volunteer signed it with `entered_by`.
+        """
+
+        self.buffer.put(self.dm.comment_values(comment))
+        self.dm.dequeue_comment(comment.directory, comment.track)
+
+    @staticmethod
+    def read_xlsx(file, header:int=0) -> pd.DataFrame:
+        return pd.read_excel(file, header=int(header))
@@ -1,115 +1,185 @@
 import click
 from flask import current_app, Flask, g
 from flask.cli import with_appcontext
+import functools
+import operator
+import pandas as pd
 import sqlite3
+import threading
+import time
 
 from public_comment.const import *
+from public_comment.matcher import KeywordMatcher
+from public_comment.metrics import metrics
 from public_comment.models import *
 
-class Row(sqlite3.Row):
-    def __init__(self, cursor, values):
-        self.cursor = cursor
-        self.values = values
-        self.columns = [col[0] for col in cursor.description]
-        self.id = " ".join([str(val) for col, val in zip(self.columns, self.values) if 'id' in col]) # combines values with 'id' in column name.
-        self.val = " ".join([str(val) for col, val in zip(self.columns, self.values) if 'val' in col]) # combines values with 'val' in column name.
+class Row(tuple):
+    """
+    A database row: a tuple of values whose columns can also be read by name,
+        as `row['col']`, `row.col` or `row.get('col')`.
+    Each distinct set of columns gets its own subclass, built once, holding the column layout.
+    """
 
-        for col, val in zip(self.columns, self.values):
-            setattr(self, col, val)
+    __slots__ = ()
+    columns = ()
+    _index = {}
+    _last = (None, None)
 
-    def get(self, attr:str):
+    @staticmethod
+    def factory(cursor, values):
         """
-        Returns the value of `attr` if present
-            else, returns None.
+        sqlite3 row factory.
+        The layout is looked up once per cursor description rather than once per row.
         """
 
-        return getattr(self, attr, None)
+        description, layout = Row._last
+        if description is not cursor.description:
+            description = cursor.description
+            layout = Row.layout(tuple(col[0] for col in description))
+            Row._last = (description, layout)
 
-    def items(self):
-        return zip(self.columns, self.values)
+        return layout(values)
 
-    def to_dict(self):
-        return {col: val for col, val in zip(self.columns, self.values)}
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def layout(columns:tuple) -> type:
+        """
+        Returns the Row subclass for `columns`, with a property per column.
+        """
 
-    @classmethod
-    def _coerce_type(cls, val, separator=",", none=None):
+        index = {}
+        for idx, col in enumerate(columns):
+            index.setdefault(col, idx)
+
+        attrs = {'__slots__': (), 'columns': columns, '_index': index}
+        for col, idx in index.items():
+            if col.isidentifier() and not hasattr(Row, col):
+                attrs[col] = property(operator.itemgetter(idx))
+
+        return type('Row', (Row,), attrs)
+
+    @property
+    def id(self) -> str:
+        """
+        Combines values with 'id' in column name.
+        """
+
+        return " ".join([str(val) for col, val in zip(self.columns, self) if 'id' in col])
+
+    @property
+    def val(self) -> str:
         """
-        Coerces `val` as a float or int if applicable,
-        if `val` is None, returns the value of `none`
-        else returns original value.
+        Combines values with 'val' in column name.
+        """
+
+        return " ".join([str(val) for col, val in zip(self.columns, self) if 'val' in col])
 
-        :param val: Value to coerce.
+    def get(self, attr:str, default=None):
+        """
+        Returns the value of `attr` if present
+            else, returns `default`.
         """
 
-        if val is None:
-            val = none
-        elif isinstance(val, str):
-            if len(coll := val.split(separator)) > 1:
-                val = [cls._coerce_type(elem.strip()) for elem in coll]
+        idx = self._index.get(attr)
+
+        return default if idx is None else tuple.__getitem__(self, idx)
+
+    def keys(self):
+        """
+        Returns the distinct column names; a column repeated by a join resolves to its first occurrence.
+        """
 
+        return self._index.keys()
+
+    def items(self):
+        return ((col, tuple.__getitem__(self, idx)) for col, idx in self._index.items())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
             try:
-                if "." in str(val):
-                    val = float(val)
-                else:
-                    val = int(val)
-            except TypeError: pass
-            except ValueError: pass
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
 
-        return val
+        return tuple.__getitem__(self, key)
+
+    def __repr__(self): return f"{self.id}: {self.val}"
+
+
+def reference_data(loader):
+    """
+    Caches what `loader` returns as a tuple for the life of the process.
+    Reference tables only change when the database is initialized,
+        so the cache is dropped whenever the schema version changes.
+    """
+
+    @functools.wraps(loader)
+    def wrapped_loader(self):
+        self.check_reference()
 
-    def __getitem__(self, key:str):
         try:
-            return getattr(self, key)
-        except AttributeError:
-            raise KeyError
+            return DataManager._reference[loader.__name__]
+        except KeyError:
+            data = DataManager._reference[loader.__name__] = tuple(loader(self))
+            return data
 
-    def __repr__(self): return f"{self.id}: {self.val}"
+    return wrapped_loader
 
 
 class DataManager:
+    _reference = {}
+    _reference_version = None
+    _reference_checked = 0.0
+
+    _matchers = {}
+    _keywords_version = None
+    _keywords_checked = 0.0
+
+    _pool = threading.local()
+
     @staticmethod
     def get_db() -> sqlite3.Connection:
         if 'db' not in g:
-            g.db = sqlite3.connect(
-                current_app.config['DATABASE'],
-                detect_types=sqlite3.PARSE_DECLTYPES
-            )
-            g.db.row_factory = Row
+            g.db = DataManager.connect(current_app.config)
         
         return g.db
 
     @staticmethod
-    def coerce_type(val, separator=",", none=None):
+    def connect(config:dict) -> sqlite3.Connection:
         """
-        Coerces `val` as a float or int if applicable,
-        if `val` is None, returns the value of `none`
-        else returns original value.
-
-        :param val: Value to coerce.
+        Returns the calling thread's connection to `config['DATABASE']`,
+            opening it on first use and reusing it for every later request handled by the thread.
         """
 
-        if val is None:
-            val = none
-        elif isinstance(val, str):
-            if len(coll := val.split(separator)) > 1:
-                val = [Model._coerce_type(elem.strip()) for elem in coll]
+        connections = DataManager._pool.__dict__.setdefault('connections', {})
+        db = connections.get(config['DATABASE'])
 
-            try:
-                if "." in str(val):
-                    val = float(val)
-                else:
-                    val = int(val)
-            except (TypeError, ValueError):
-                val = f"'{val}'"
+        if db is None:
+            db = sqlite3.connect(
+                config['DATABASE'],
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                cached_statements=config['SQLITE_CACHED_STATEMENTS']
+            )
+            db.row_factory = Row.factory
+            db.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+            db.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+            db.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+            db.execute(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+            connections[config['DATABASE']] = db
 
-        return val
+        return db
 
-    def run_query(self, query:str, datatype=None) -> list:
+    def run_query(self, query:str, params=(), datatype=None) -> list:
         """
         If a SELECT statement, runs the query and
             if `datatype` converts the results to the datatype provided
             else returns a list of Row objects
         else, runs the query and commits to database.
+
+        :param params: Values bound to the query's placeholders.
         """
 
         db = self.get_db()
@@ -117,20 +187,32 @@ class DataManager:
 
         directive = query.split()[0]
         if directive.upper() == 'SELECT':
-            results = db.execute(query).fetchall()
+            results = self.fetch(query, params)
 
             if datatype:
-                results = [datatype.from_row(result) for result in results]
+                results = datatype.from_records(results)
 
         else:
-            db.execute(query)
-            db.commit()
+            with metrics.query(query):
+                db.execute(query, params)
+                db.commit()
 
         return results
 
+    def fetch(self, query:str, params=()) -> list:
+        """
+        Runs a query and returns all of its rows, timed by the query's shape.
+        """
+
+        with metrics.query(query) as stats:
+            rows = self.get_db().execute(query, params).fetchall()
+            stats['rows'] = len(rows)
+
+        return rows
+
     #TODO: somehow connect joining on the same table multiples times to the select columns
     @classmethod
-    def _join(cls, from_table:str, join:dict) -> str:
+    def _join(cls, from_table:str, join) -> str:
         """
         Creates a left join clause for each table-column pair in `join`.
         """
@@ -139,12 +221,13 @@ class DataManager:
         if join:
             joins = []
             if isinstance(join, dict):
-                for idx, (table, on) in enumerate(join.items()):
+                join = join.items()
+            if cls.is_iter(join):
+                for idx, pair in enumerate(join):
+                    if isinstance(pair, str):
+                        raise NotImplementedError("Table names are plural; default id columns are singular.")
+                    table, on = pair
                     joins.append(f"LEFT JOIN {table} AS {table}{idx} ON {table}{idx}.{on} = {from_table}.{on}")
-            elif cls.is_iter(join):
-                for idx, table in enumerate(join):
-                    joins.append(f"LEFT JOIN {table} AS {table}{idx} ON {table}{idx}.{table}_id = {from_table}.{table}_id")
-                raise NotImplementedError("Table names are plural; default id columns are singular.")
             
             JOIN = "\t\n".join(joins)
 
@@ -168,7 +251,7 @@ class DataManager:
         """
         If `columns` is a 
             str: returns unaltered.
-            dict: joins table-column pairs as '`table`.column'.
+            dict (or its items): joins table-column pairs as '`table`.column'.
             iterable: joins columns.
         """
         
@@ -178,46 +261,95 @@ class DataManager:
         elif isinstance(columns, dict):
             COLUMNS += ", ".join(f"`{table}`.{column}" for table, column in columns.items())
         elif hasattr(columns, "__iter__"):
-            COLUMNS += ", ".join(columns)
+            COLUMNS += ", ".join(column if isinstance(column, str) else "`{}`.{}".format(*column) for column in columns)
 
         return COLUMNS
 
     @classmethod
-    def _where(cls, conditions, pk='id', val='val') -> str:
+    def _where(cls, conditions, pk='id', val='val') -> tuple:
         """
+        Returns a WHERE clause with `?` placeholders and the parameters to bind to them.
+        If `conditions` is an
+            int: matches `pk`.
+            str: matches `val`.
+            dict: matches every column-value pair; None values match NULL.
+
+        :raises TypeError: If `conditions` is of any other type, rather than matching every row.
         """
 
-        WHERE = ""
         try:
-            WHERE += f"{pk} = {int(conditions)}"
+            return f"{pk} = ?", (int(conditions),)
         except ValueError:
             if isinstance(conditions, str):
-                WHERE += f"{val} = '{conditions}'"
+                return f"{val} = ?", (conditions,)
         except TypeError:
             if isinstance(conditions, dict):
-                WHERE += " AND ".join([f"{col} = {cls.coerce_type(val)}" for col, val in conditions.items()])
+                shape = tuple((col, value is None) for col, value in conditions.items())
+                params = tuple(value for value in conditions.values() if value is not None)
+                return cls._where_shape(shape), params
+
+        raise TypeError(f"Can't build a WHERE clause from {type(conditions).__name__} {conditions!r}; pass an int, str or dict.")
 
-        return WHERE
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _where_shape(shape:tuple) -> str:
+        """
+        Returns the WHERE clause for a tuple of (column, is null) pairs.
+        """
+
+        return " AND ".join(f"{col} IS NULL" if is_null else f"{col} = ?" for col, is_null in shape)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _select(cls, table:str, columns, join, where:str) -> str:
+        """
+        Returns the SELECT template for a table, column, join and WHERE clause combination.
+        Reusing the same string for the same shape lets sqlite reuse its prepared statement.
+        """
+
+        return "SELECT {COLUMNS} FROM {TABLE} {JOIN} {WHERE}".format(
+            COLUMNS=cls._columns(columns),
+            TABLE=table,
+            JOIN=cls._join(table, join),
+            WHERE=f"WHERE {where}" if where else ""
+        )
+
+    @staticmethod
+    def _hashable(obj):
+        """
+        Returns `obj` as something `functools.lru_cache` can key on.
+        """
+
+        if isinstance(obj, dict):
+            return tuple(obj.items())
+        if isinstance(obj, list):
+            return tuple(obj)
+
+        return obj
 
     def select(self, table:str, columns='*', join=None, where=None, datatype=None) -> list:
         """
         SELECT `columns` FROM `table`
         """
 
-        SELECT = "SELECT {COLUMNS} FROM {TABLE} {JOIN} {WHERE}" \
-            .format(
-                COLUMNS=self._columns(columns),
-                TABLE=table,
-                JOIN=self._join(table, join),
-                WHERE=f"WHERE {self._where(where)}" if where else ""
-            )
+        WHERE, params = self._where(where) if where else ("", ())
+        SELECT = self._select(table, self._hashable(columns), self._hashable(join), WHERE)
 
-        results = self.get_db().execute(SELECT).fetchall()
+        results = self.fetch(SELECT, params)
         if datatype:
-            results = [datatype.from_row(result) for result in results]
+            results = datatype.from_records(results)
 
         return results
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _insert(table:str, columns:tuple) -> str:
+        return "INSERT INTO `{TABLE}` ({COLUMNS}) VALUES ({VALUES})".format(
+            TABLE=table,
+            COLUMNS=", ".join(columns),
+            VALUES=", ".join("?" * len(columns))
+        )
+
     #TODO: columns parameter 
     #? and maybe intersection of table columns and values
     def insert(self, table:str, values:dict, datatype=None) -> None:
@@ -225,27 +357,356 @@ class DataManager:
         INSERT INTO `table` VALUES (`values`)
         """
         
+        self.insert_many(table, [values], datatype=datatype)
+
+    def insert_many(self, table:str, rows:list, datatype=None) -> None:
+        """
+        INSERT INTO `table` VALUES (`values`) for each dictionary of values in `rows`,
+            in a single transaction.
+        """
+
         if datatype:
-            new_obj = datatype.from_dict(values)
-            values = new_obj.to_dict()
+            rows = [datatype.from_dict(values).to_dict() for values in rows]
 
-        cols = self.get_columns(table)[1:]
-        INSERT = "INSERT INTO `{TABLE}` ({COLUMNS}) VALUES ({VALUES})".format(
-            TABLE=table,
-            COLUMNS=", ".join(cols),
-            VALUES=", ".join("?" * len(cols))
-        )
+        cols = tuple(self.get_columns(table)[1:])
 
         db = self.get_db()
-        db.execute(
-            INSERT,
-            [f"{values.get(key)}" for key in cols]
+        with db:
+            db.executemany(
+                self._insert(table, cols),
+                ([self._to_sql(values.get(key)) for key in cols] for values in rows)
+            )
+
+    def get_comment(self, directory:str, track:int) -> Comment:
+        """
+        Returns the comment keyed by (`directory`, `track`) or None.
+        """
+
+        comments = self.select(COMMENTS, where={DIRECTORY: directory, TRACK: track}, datatype=Comment)
+
+        return comments[0] if comments else None
+
+    def get_comment_batch(self, columns='*', where=None) -> CommentBatch:
+        """
+        Returns the comments matching `where` as a `CommentBatch`, read straight into columns.
+        Leaving out the transcript columns keeps summaries cheap.
+        """
+
+        WHERE, params = self._where(where) if where else ("", ())
+        SELECT = self._select(COMMENTS, self._hashable(columns), None, WHERE)
+
+        with metrics.query(SELECT) as stats:
+            frame = pd.read_sql_query(SELECT, self.get_db(), params=params)
+            stats['rows'] = len(frame)
+
+        return CommentBatch(frame)
+
+    # columns listed by the review table; the transcript is cut to an excerpt to keep pages small
+    page_columns = (DIRECTORY, TRACK, ENTERED_BY, 'caller', 'district', 'neighborhood', 'zone', 'npu', 'topic', 'intent')
+    page_filters = (ENTERED_BY, 'district', 'npu', 'zone', 'intent')
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _page(cls, where:str, after:bool, descending:bool) -> str:
+        """
+        Returns the keyset pagination query for a WHERE clause shape.
+        Rows are ordered by the primary key (directory, track), so the page after a row starts right past its key
+            in the primary key or filter column's index; no rows are skipped over as with OFFSET.
+        """
+
+        conditions = [where] if where else []
+        if after:
+            conditions.append(f"({DIRECTORY}, {TRACK}) {'<' if descending else '>'} (?, ?)")
+        direction = 'DESC' if descending else 'ASC'
+
+        return "SELECT {COLUMNS}, substr(COALESCE({EDITED_TEXT}, {FULL_TEXT}), 1, 200) AS excerpt FROM {TABLE} {WHERE} ORDER BY {DIRECTORY} {DIRECTION}, {TRACK} {DIRECTION} LIMIT ?".format(
+            COLUMNS=", ".join(cls.page_columns),
+            EDITED_TEXT=EDITED_TEXT,
+            FULL_TEXT=FULL_TEXT,
+            TABLE=COMMENTS,
+            WHERE=f"WHERE {' AND '.join(conditions)}" if conditions else "",
+            DIRECTORY=DIRECTORY,
+            TRACK=TRACK,
+            DIRECTION=direction
         )
+
+    def page_comments(self, filters:dict=None, after:tuple=None, limit:int=100, descending:bool=False) -> list:
+        """
+        Returns a page of comments in (directory, track) order.
+
+        :param filters: Column values to match, from `page_filters`; None matches NULL.
+        :param after: (directory, track) of the last row of the previous page.
+        :param limit: Maximum number of rows.
+        :param descending: Page from the last comment backwards.
+        :return: List of Rows with `page_columns` and an 'excerpt' of the transcript.
+        """
+
+        filters = {col: val for col, val in (filters or {}).items() if col in self.page_filters}
+        WHERE, params = self._where(filters) if filters else ("", ())
+        SELECT = self._page(WHERE, after is not None, descending)
+
+        return self.fetch(SELECT, (*params, *(after or ()), limit))
+
+    def get_random_comment(self) -> Comment:
+        comments = self.run_query(f"SELECT * FROM {COMMENTS} ORDER BY RANDOM() LIMIT 1", datatype=Comment)
+
+        return comments[0] if comments else None
+
+    def claim_comment(self, claimant:str, lease:float, exclude=()) -> tuple:
+        """
+        Atomically leases an unentered comment to `claimant` for `lease` seconds.
+        A claimant holding an unexpired lease gets the same comment back with its lease renewed;
+            otherwise the first comment that was never claimed, or whose lease has lapsed, is claimed.
+        Comments never claimed have a lease that expired at 0, so either is found by one seek on the lease index.
+
+        :param claimant: Identifier of the volunteer.
+        :param lease: Duration of the lease in seconds.
+        :param exclude: (directory, track) keys the claimant has already finished.
+        :return: (directory, track) of the claimed comment, or None if the queue is empty.
+        """
+
+        with metrics.span('queue_claim'):
+            return self._claim_comment(claimant, lease, exclude)
+
+    def _claim_comment(self, claimant:str, lease:float, exclude=()) -> tuple:
+        now = time.time()
+        db = self.get_db()
         db.commit()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            held = db.execute(
+                f"SELECT {DIRECTORY}, {TRACK} FROM {QUEUE} WHERE {CLAIMED_BY} = ? AND {LEASE_EXPIRES} >= ?",
+                (claimant, now)
+            ).fetchall()
+            keys = [key for key in ((row[DIRECTORY], row[TRACK]) for row in held) if key not in exclude]
+
+            if not keys:
+                available = db.execute(
+                    f"SELECT {DIRECTORY}, {TRACK} FROM {QUEUE} WHERE {LEASE_EXPIRES} < ? ORDER BY {LEASE_EXPIRES} LIMIT 1",
+                    (now,)
+                ).fetchone()
+                keys = [(available[DIRECTORY], available[TRACK])] if available else []
+
+            if keys:
+                db.execute(
+                    f"UPDATE {QUEUE} SET {CLAIMED_BY} = ?, {LEASE_EXPIRES} = ? WHERE {DIRECTORY} = ? AND {TRACK} = ?",
+                    (claimant, now + lease, *keys[0])
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return keys[0] if keys else None
+
+    def peek_comment(self) -> tuple:
+        """
+        Returns the (directory, track) `claim_comment` would lease next, without leasing it; None if the queue is empty.
+        """
+
+        rows = self.fetch(f"SELECT {DIRECTORY}, {TRACK} FROM {QUEUE} WHERE {LEASE_EXPIRES} < ? ORDER BY {LEASE_EXPIRES} LIMIT 1", (time.time(),))
+
+        return (rows[0][DIRECTORY], rows[0][TRACK]) if rows else None
+
+    def dequeue_comment(self, directory:str, track:int) -> None:
+        """
+        Takes a reviewed comment off the queue, whoever holds its lease.
+        """
+
+        db = self.get_db()
+        with db:
+            db.execute(f"DELETE FROM {QUEUE} WHERE {DIRECTORY} = ? AND {TRACK} = ?", (directory, track))
+
+    def release_comment(self, directory:str, track:int, claimant:str) -> None:
+        """
+        Returns the comment leased by `claimant` to the queue, behind comments that were never claimed.
+        """
+
+        db = self.get_db()
+        with db:
+            db.execute(
+                f"UPDATE {QUEUE} SET {CLAIMED_BY} = NULL, {LEASE_EXPIRES} = ? WHERE {DIRECTORY} = ? AND {TRACK} = ? AND {CLAIMED_BY} = ?",
+                (time.time(), directory, track, claimant)
+            )
+
+    def refresh_queue(self) -> None:
+        """
+        Queues every unentered comment and dequeues entered ones.
+        """
+
+        db = self.get_db()
+        with db:
+            self._refresh_queue(db)
+
+    @staticmethod
+    def _refresh_queue(db:sqlite3.Connection) -> None:
+        """
+        Runs `refresh_queue`'s statements in the caller's transaction.
+        """
 
-    def get_neighborhoods(self): return self.select(NEIGHBORHOODS, join={'npus': 'npu_id', 'zones': 'zone_id'}, datatype=Neighborhood)
+        db.execute(f"""
+            INSERT OR IGNORE INTO {QUEUE} ({DIRECTORY}, {TRACK})
+                SELECT {DIRECTORY}, {TRACK} FROM {COMMENTS} WHERE {ENTERED_BY} IS NULL""")
+        db.execute(f"""
+            DELETE FROM {QUEUE} WHERE EXISTS (
+                SELECT 1 FROM {COMMENTS}
+                    WHERE {COMMENTS}.{DIRECTORY} = {QUEUE}.{DIRECTORY} AND {COMMENTS}.{TRACK} = {QUEUE}.{TRACK}
+                    AND {COMMENTS}.{ENTERED_BY} IS NOT NULL)""")
+
+    def create_job(self, job_id:str, file_path:str, header:int) -> None:
+        now = time.time()
+        db = self.get_db()
+        with db:
+            db.execute(
+                f"INSERT INTO {JOBS} ({JOB_ID}, file_path, header, {STATUS}, {PROGRESS}, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, file_path, header, QUEUED, 0.0, now, now)
+            )
+
+    def update_job(self, job_id:str, status:str, progress:float, message:str=None, rows:int=None) -> None:
+        """
+        Records a job reaching a new stage.
+        """
+
+        db = self.get_db()
+        with db:
+            db.execute(
+                f"UPDATE {JOBS} SET {STATUS} = ?, {PROGRESS} = ?, message = COALESCE(?, message), rows = COALESCE(?, rows), updated = ? WHERE {JOB_ID} = ?",
+                (status, progress, message, rows, time.time(), job_id)
+            )
+
+    def get_job(self, job_id:str):
+        jobs = self.select(JOBS, where={JOB_ID: job_id})
+
+        return jobs[0] if jobs else None
+
+    def count_comments(self) -> int:
+        return self.fetch(f"SELECT COUNT(*) AS count FROM {COMMENTS}")[0]['count']
+
+    def import_comments(self, columns:list, rows:list, merge:bool=False) -> None:
+        """
+        Inserts `rows` into the comments table and queues the unentered ones, in a single transaction,
+            so other connections see either none of the rows or all of them.
+        Comments already present are kept as they are, unless `merge`.
+
+        :param columns: Comments table columns, in the order of each row's values.
+        :param rows: Iterable of value sequences.
+        :param merge: Fill in the columns comments already present lack from `rows`;
+            values already in the table, such as those volunteers entered, are never overwritten.
+        """
+
+        if merge:
+            CONFLICT = "ON CONFLICT ({DIRECTORY}, {TRACK}) DO UPDATE SET {SET}".format(
+                DIRECTORY=DIRECTORY,
+                TRACK=TRACK,
+                SET=", ".join(f"{col} = COALESCE({COMMENTS}.{col}, excluded.{col})" for col in columns if col not in (DIRECTORY, TRACK))
+            )
+        else:
+            CONFLICT = "ON CONFLICT DO NOTHING"
+
+        INSERT = "INSERT INTO {TABLE} ({COLUMNS}) VALUES ({VALUES}) {CONFLICT}".format(
+            TABLE=COMMENTS,
+            COLUMNS=", ".join(columns),
+            VALUES=", ".join("?" * len(columns)),
+            CONFLICT=CONFLICT
+        )
+
+        db = self.get_db()
+        with db:
+            with metrics.query(INSERT) as stats:
+                stats['rows'] = db.executemany(INSERT, rows).rowcount
+            self._refresh_queue(db)
+
+    def update_comment(self, comment:Comment) -> None:
+        """
+        Writes the fields `comment` has values for to its row in the comments table.
+        """
+
+        self.update_comments([self.comment_values(comment)])
+
+    def update_comments(self, comments:list) -> None:
+        """
+        Applies each dictionary of column values in `comments` to the row sharing its directory and track,
+            in a single transaction.
+        Columns without a value (None) are left unchanged.
+        Comments given an `entered_by` are removed from the queue.
+        """
+
+        cols = [col for col in self.get_columns(COMMENTS) if col not in (DIRECTORY, TRACK)]
+        UPDATE = "UPDATE {TABLE} SET {SET} WHERE {DIRECTORY} = ? AND {TRACK} = ?".format(
+            TABLE=COMMENTS,
+            SET=", ".join(f"{col} = COALESCE(?, {col})" for col in cols),
+            DIRECTORY=DIRECTORY,
+            TRACK=TRACK
+        )
+
+        db = self.get_db()
+        with metrics.query(UPDATE) as stats, db:
+            stats['rows'] = db.executemany(
+                UPDATE,
+                ([self._to_sql(values.get(col)) for col in cols] + [values[DIRECTORY], values[TRACK]] for values in comments)
+            ).rowcount
+            db.executemany(
+                f"DELETE FROM {QUEUE} WHERE {DIRECTORY} = ? AND {TRACK} = ?",
+                ((values[DIRECTORY], values[TRACK]) for values in comments if values.get(ENTERED_BY) is not None)
+            )
+
+    @staticmethod
+    def comment_values(comment:Comment) -> dict:
+        """
+        Returns `comment` as a dictionary of comments table columns.
+        Blank strings, as left by empty form fields, become None so they leave the stored values unchanged.
+        This is intended: the form fills in and corrects values but never erases them,
+            since fields it doesn't pre-fill (such as the district and zone menus) also come back blank.
+        """
+
+        values = comment.to_dict(flat=True)
+        values[EDITED_TEXT] = values.pop('text', None)
+
+        return {col: None if isinstance(val, str) and not val.strip() else val for col, val in values.items()}
+
+    @staticmethod
+    def _to_sql(val):
+        """
+        Returns `val` as a value SQLite can store;
+            list fields are joined back together.
+        """
+
+        if isinstance(val, list):
+            val = ", ".join(str(elem) for elem in val)
+
+        return val
+
+    def check_reference(self) -> None:
+        """
+        Clears the reference data cache if the schema version has changed.
+        The version is read at most once every REFERENCE_TTL seconds.
+        """
+
+        now = time.monotonic()
+        if now - DataManager._reference_checked < current_app.config['REFERENCE_TTL']:
+            return
+
+        version = self.fetch("PRAGMA schema_version")[0]['schema_version']
+        if version != DataManager._reference_version:
+            DataManager.clear_reference()
+            DataManager._reference_version = version
+        DataManager._reference_checked = now
+
+    @staticmethod
+    def clear_reference() -> None:
+        DataManager._reference = {}
+        DataManager._reference_checked = 0.0
+
+    @reference_data
+    def get_neighborhoods(self): 
+        neighborhoods = self.select(NEIGHBORHOODS, join={'npus': 'npu_id', 'zones': 'zone_id'}, datatype=Neighborhood)
+
+        return sorted(neighborhoods, key=lambda neighborhood: neighborhood.name)
+
+    @reference_data
     def get_districts(self): return self.select(DISTRICTS, datatype=District)
     
+    @reference_data
     def get_npus(self): 
         query = """
             SELECT npus.npu_id, npus.npu_val, GROUP_CONCAT(neighborhood_val, ',') AS neighborhoods 
@@ -258,7 +719,7 @@ class DataManager:
 
         return npus
             
-        
+    @reference_data
     def get_zones(self): 
         query = """
             SELECT zones.zone_id, zones.zone_val, GROUP_CONCAT(neighborhood_val, ',') AS neighborhoods 
@@ -270,6 +731,72 @@ class DataManager:
 
         return zones
 
+    def keywords_version(self) -> int:
+        """
+        Returns the keywords' version, which every change to the keywords table increments.
+        """
+
+        return self.run_query("SELECT version FROM keywords_version;")[0]['version']
+
+    def get_keywords(self, highlight:bool=False) -> dict:
+        """
+        Returns the keywords of each sentiment.
+
+        :param highlight: Include the keywords that are only highlighted, under the sentiment ''.
+        """
+
+        keywords = {}
+        for row in self.run_query(f"SELECT {KEYWORD_VAL}, {SENTIMENT} FROM {KEYWORDS} ORDER BY {SENTIMENT}, {KEYWORD_VAL};"):
+            if row[SENTIMENT] or highlight:
+                keywords.setdefault(row[SENTIMENT], []).append(row[KEYWORD_VAL])
+
+        return keywords
+
+    def get_matcher(self, stems:bool=False, highlight:bool=False) -> KeywordMatcher:
+        """
+        Returns the KeywordMatcher compiled from the keywords table.
+        Matchers are compiled once and reused until the keywords' version changes;
+            the version is read at most once every KEYWORDS_TTL seconds.
+
+        :param stems: Also match words that merely start with a keyword.
+        :param highlight: Include the keywords that are only highlighted.
+        """
+
+        now = time.monotonic()
+        if now - DataManager._keywords_checked >= current_app.config['KEYWORDS_TTL']:
+            version = self.keywords_version()
+            if version != DataManager._keywords_version:
+                DataManager._matchers = {}
+                DataManager._keywords_version = version
+            DataManager._keywords_checked = now
+
+        try:
+            return DataManager._matchers[stems, highlight]
+        except KeyError:
+            matcher = DataManager._matchers[stems, highlight] = KeywordMatcher(self.get_keywords(highlight), stems)
+            return matcher
+
+    def add_keyword(self, keyword:str, sentiment:str='') -> None:
+        db = self.get_db()
+        with db:
+            db.execute(f"INSERT OR IGNORE INTO {KEYWORDS} ({KEYWORD_VAL}, {SENTIMENT}) VALUES (?, ?);", (keyword.lower(), sentiment))
+        DataManager._keywords_checked = 0.0
+
+    def remove_keyword(self, keyword:str, sentiment:str=None) -> None:
+        """
+        Removes `keyword` from `sentiment`, or from every sentiment if None.
+        """
+
+        conditions = {KEYWORD_VAL: keyword.lower()}
+        if sentiment is not None:
+            conditions[SENTIMENT] = sentiment
+
+        where, params = self._where(conditions)
+        db = self.get_db()
+        with db:
+            db.execute(f"DELETE FROM {KEYWORDS} WHERE {where};", params)
+        DataManager._keywords_checked = 0.0
+
     @staticmethod
     def is_iter(obj) -> bool:
         return hasattr(obj, '__iter__') and not isinstance(obj, str)
@@ -281,17 +808,26 @@ class DataManager:
         with current_app.open_resource('schema.sql') as f:
             db.executescript(f.read().decode('utf8'))
 
+        DataManager.clear_reference()
+        DataManager._keywords_checked = 0.0
+
     @staticmethod
     def init_app(app:Flask):
         app.teardown_appcontext(DataManager.close_db)
         app.cli.add_command(DataManager.init_db_command)
+        app.cli.add_command(DataManager.add_keyword_command)
+        app.cli.add_command(DataManager.remove_keyword_command)
         
     @staticmethod
     def close_db(e=None):
+        """
+        Hands the connection back to the thread's pool, discarding any uncommitted changes.
+        """
+
         db = g.pop('db', None)
 
-        if db is not None:
-            db.close()
+        if db is not None and db.in_transaction:
+            db.rollback()
 
     @staticmethod
     @click.command('init-db')
@@ -301,3 +837,25 @@ class DataManager:
 
         DataManager().init_db()
         click.echo(f"Initialized the database.")
+
+    @staticmethod
+    @click.command('add-keyword')
+    @click.argument('keyword')
+    @click.option('--sentiment', default='', help="Sentiment the keyword indicates; leave out to only highlight it.")
+    @with_appcontext
+    def add_keyword_command(keyword:str, sentiment:str):
+        """ Add a keyword."""
+
+        DataManager().add_keyword(keyword, sentiment)
+        click.echo(f"Added {keyword!r}.")
+
+    @staticmethod
+    @click.command('remove-keyword')
+    @click.argument('keyword')
+    @click.option('--sentiment', default=None, help="Only remove the keyword from this sentiment.")
+    @with_appcontext
+    def remove_keyword_command(keyword:str, sentiment:str):
+        """ Remove a keyword."""
+
+        DataManager().remove_keyword(keyword, sentiment)
+        click.echo(f"Removed {keyword!r}.")
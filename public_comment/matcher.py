@@ -0,0 +1,170 @@
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import re
+
+class KeywordMatcher:
+    """
+    Finds the keywords of every sentiment in a text with a single scan.
+    The keywords are compiled once into one alternation, factored by common prefix
+        and bounded by word boundaries.
+    """
+
+    cache_size = 1024
+
+    def __init__(self, sentiment_keywords:dict, stems:bool=False):
+        """
+        :param sentiment_keywords: Dictionary of sentiments and their keywords.
+        :param stems: Also match words that merely start with a keyword (e.g. 'afford' in 'affordable').
+        """
+
+        self.sentiments = tuple(sentiment_keywords)
+        self.version = hashlib.sha1(json.dumps([sentiment_keywords, stems], sort_keys=True).encode()).hexdigest()[:12]
+        self.keywords = {}
+        for sentiment, keywords in sentiment_keywords.items():
+            for keyword in keywords:
+                sentiments = self.keywords.setdefault(keyword.lower(), [])
+                if sentiment not in sentiments:
+                    sentiments.append(sentiment)
+
+        self.pattern = self.compile(self.keywords, stems, flags=re.IGNORECASE)
+        self._lower_pattern = self.compile(self.keywords, stems)
+        self._spans = {}
+
+        # keyword x sentiment incidence matrix, for tagging whole columns
+        self._keyword_index = {keyword: idx for idx, keyword in enumerate(self.keywords)}
+        self._incidence = np.zeros((len(self.keywords), len(self.sentiments)), dtype=bool)
+        for keyword, sentiments in self.keywords.items():
+            for sentiment in sentiments:
+                self._incidence[self._keyword_index[keyword], self.sentiments.index(sentiment)] = True
+
+    @classmethod
+    def compile(cls, keywords, stems:bool=False, flags:int=0) -> re.Pattern:
+        """
+        Compiles `keywords` into a single regular expression whose first group is the keyword matched.
+        """
+
+        if not keywords:
+            return re.compile(r"(?!)")
+
+        suffix = r"\w*" if stems else ""
+
+        return re.compile(rf"\b({cls._factor(keywords)}){suffix}\b", flags)
+
+    @classmethod
+    def _factor(cls, keywords) -> str:
+        """
+        Builds an alternation of `keywords` factored by common prefix (a trie),
+            so the regex engine tries each character once rather than once per keyword.
+        """
+
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node:dict) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+
+            alternation = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            return f"(?:{alternation})?" if '' in node else alternation
+
+        return build(trie)
+
+    def scan(self, text:str) -> dict:
+        """
+        Finds every keyword in `text`.
+
+        :param text: Text to scan.
+        :return: Dictionary of sentiments mentioned and the (start, end) offsets of their keywords.
+        """
+
+        hits = {}
+        for match in self.pattern.finditer(text):
+            for sentiment in self.keywords[match.group(1).lower()]:
+                hits.setdefault(sentiment, []).append(match.span())
+
+        return hits
+
+    def mentions(self, text:str) -> set:
+        """
+        Returns the sentiments with at least one keyword in `text`.
+        """
+
+        return {sentiment for match in self.pattern.finditer(text) for sentiment in self.keywords[match.group(1).lower()]}
+
+    def spans(self, text:str) -> tuple:
+        """
+        Returns the (start, end) offsets of every keyword in `text`, in order.
+        Results are cached by the hash of `text`.
+        """
+
+        digest = hashlib.sha1(text.encode()).digest()
+        try:
+            return self._spans[digest]
+        except KeyError:
+            pass
+
+        if len(self._spans) >= self.cache_size:
+            self._spans.clear()
+        spans = self._spans[digest] = tuple(match.span() for match in self.pattern.finditer(text))
+
+        return spans
+
+    def highlight(self, text:str) -> list:
+        """
+        Splits `text` into (segment, is keyword) pairs for rendering.
+        """
+
+        if not isinstance(text, str):
+            return []
+
+        segments = []
+        position = 0
+        for start, end in self.spans(text):
+            if start > position:
+                segments.append((text[position:start], False))
+            segments.append((text[start:end], True))
+            position = end
+        if position < len(text):
+            segments.append((text[position:], False))
+
+        return segments
+
+    def tag(self, texts:pd.Series, sentiments=None) -> np.ndarray:
+        """
+        Tags a whole column of texts in one scan: the lowercased texts are joined into a single string,
+            matched once, and each match is mapped back to its row by offset.
+
+        :param texts: Series of texts; missing texts mention nothing.
+        :param sentiments: Sentiments to tag, in column order. Defaults to every sentiment.
+        :return: Boolean array of shape (len(texts), len(sentiments)).
+        """
+
+        sentiments = self.sentiments if sentiments is None else sentiments
+        present = texts.notna().to_numpy()
+        lowered = texts[present].astype(str).str.lower().tolist()
+
+        hits = np.zeros((len(lowered), len(self.keywords)), dtype=bool)
+        if lowered:
+            starts = np.cumsum([0] + [len(text) + 1 for text in lowered[:-1]])
+            matches = [(match.start(), self._keyword_index[match.group(1)]) for match in self._lower_pattern.finditer("\n".join(lowered))]
+            if matches:
+                offsets, keywords = np.array(matches).T
+                hits[np.searchsorted(starts, offsets, side='right') - 1, keywords] = True
+
+        columns = [self.sentiments.index(sentiment) if sentiment in self.sentiments else None for sentiment in sentiments]
+        incidence = np.zeros((len(self.keywords), len(sentiments)), dtype=bool)
+        for idx, column in enumerate(columns):
+            if column is not None:
+                incidence[:, idx] = self._incidence[:, column]
+
+        matrix = np.zeros((len(texts), len(sentiments)), dtype=bool)
+        matrix[present] = (hits.astype(np.int32) @ incidence.astype(np.int32)) > 0
+
+        return matrix
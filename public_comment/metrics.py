@@ -0,0 +1,218 @@
+import bisect
+from contextlib import contextmanager
+from flask import Flask, g, request, Response
+import functools
+import jinja2
+import logging
+import re
+import threading
+import time
+
+PREFIX = 'public_comment'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, as a Prometheus histogram does.
+    """
+
+    __slots__ = ['counts', 'sum', 'count']
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value:float) -> None:
+        idx = bisect.bisect_left(BUCKETS, value)
+        if idx < len(BUCKETS):
+            self.counts[idx] += 1
+        self.sum += value
+        self.count += 1
+
+    def buckets(self):
+        """
+        Yields each bucket's upper bound and the number of observations at or below it.
+        """
+
+        total = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            yield bound, total
+        yield float('inf'), self.count
+
+
+class Metrics:
+    """
+    In-process counters and histograms, keyed by metric name and labels,
+        rendered in the Prometheus text format at /metrics.
+    Recording is a no-op until `init_app` enables it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_threshold = None
+        self.logger = logging.getLogger(__name__)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name:str, value:float=1, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name:str, value:float, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name:str, **labels):
+        """
+        Times the block into the histogram `{name}_seconds`.
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def query(self, sql:str):
+        """
+        Times a query by its shape and counts the rows it returns;
+            the block sets `stats['rows']` to the number of rows fetched.
+        Queries slower than `slow_query_threshold` seconds are logged, when a threshold is set.
+        """
+
+        stats = {'rows': 0}
+        if not self.enabled:
+            yield stats
+            return
+
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            shape = self.shape(sql)
+            self.observe('query_seconds', elapsed, shape=shape)
+            self.inc('query_rows_total', stats['rows'], shape=shape)
+
+            if self.slow_query_threshold is not None and elapsed >= self.slow_query_threshold:
+                self.inc('slow_queries_total', shape=shape)
+                self.logger.warning("Slow query (%.1f ms, %d rows): %s", elapsed * 1000, stats['rows'], shape)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def shape(sql:str) -> str:
+        """
+        Returns `sql` with its whitespace collapsed; queries bind their values as parameters,
+            so this is the same for every run of the same statement.
+        """
+
+        return re.sub(r"\s+", " ", sql).strip().rstrip(';')
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(histogram.buckets()), histogram.sum, histogram.count)) for key, histogram in self._histograms.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            name = f"{PREFIX}_{name}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            name = f"{PREFIX}_{name}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, cumulative in buckets:
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels:tuple) -> str:
+        if not labels:
+            return ""
+
+        escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+        return "{" + ",".join(f"{key}=\"{value}\"" for (key, _), value in zip(labels, escaped)) + "}"
+
+    def init_app(self, app:Flask) -> None:
+        """
+        Enables recording if `METRICS` is set: times each request and template render,
+            and serves the metrics at /metrics.
+        """
+
+        if not app.config['METRICS']:
+            return
+
+        self.enabled = True
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD']
+        self.logger = app.logger
+
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(start_request)
+        app.after_request(end_request)
+        app.add_url_rule('/metrics', 'metrics', lambda: Response(self.render(), mimetype='text/plain; version=0.0.4'))
+
+
+class TimedTemplate(jinja2.Template):
+    """
+    A template whose renders are timed by template name.
+    """
+
+    def render(self, *args, **kwargs):
+        with metrics.span('template_render', template=self.name):
+            return super().render(*args, **kwargs)
+
+
+def start_request() -> None:
+    g.request_start = time.perf_counter()
+
+def end_request(response:Response) -> Response:
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe('request_seconds', time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        metrics.inc('requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+
+    return response
+
+
+metrics = Metrics()
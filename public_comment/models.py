@@ -1,30 +1,121 @@
+import numpy as np
 import pandas as pd
 
+from public_comment.metrics import metrics
+
+_MISSING = object()
+TRUE = {'true', 'yes', 'y', '1', 'on'}
+FALSE = {'false', 'no', 'n', '0', 'off'}
+
+def _is_missing(val) -> bool:
+    return val is None or val is pd.NA or (isinstance(val, float) and val != val)
+
+def _to_str(val):
+    if _is_missing(val):
+        return None
+
+    return val if isinstance(val, str) else str(val)
+
+def _to_int(val):
+    """
+    Returns `val` as an int, or None if it's blank or not a whole number.
+    """
+
+    if isinstance(val, str):
+        try:
+            return int(val)
+        except ValueError:
+            try:
+                val = float(val)
+            except ValueError:
+                return None
+    if _is_missing(val):
+        return None
+    if isinstance(val, float) and not val.is_integer():
+        return None
+
+    return int(val)
+
+def _to_bool(val):
+    """
+    Returns `val` as a bool, or None if it's blank or a string that isn't a yes or a no.
+    """
+
+    if isinstance(val, str):
+        lowered = val.strip().lower()
+        return True if lowered in TRUE else False if lowered in FALSE else None
+    if _is_missing(val):
+        return None
+
+    return bool(val)
+
+def _to_list(val):
+    if isinstance(val, str):
+        return [elem.strip() for elem in val.split(",")]
+    if _is_missing(val):
+        return None
+
+    return list(val)
+
+def _as_is(val): return val
+
+CONVERTERS = {str: _to_str, int: _to_int, bool: _to_bool, list: _to_list}
+
+
 class Model:
+    """
+    Base for the app's models.
+    Subclasses list their fields in `__slots__` and declare each field's type in `types`;
+        fields without a type, such as nested models, are stored as given.
+    """
+
     __slots__ = ['id', 'val']
     synonyms = {}
+    types = {}
+    fields = ()
+    _synonyms = ()
+    _converters = ()
+    _convert = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Works out the class's fields, their converters and synonym pairs once, when the class is defined.
+        """
+
+        super().__init_subclass__(**kwargs)
+        cls.fields = tuple(cls.__slots__)
+        cls._synonyms = tuple(cls.synonyms.items())
+        cls._converters = tuple((field, CONVERTERS.get(cls.types.get(field), _as_is)) for field in cls.fields)
+        cls._convert = dict(cls._converters)
 
     def __init__(self, **kwargs):
-        for slot in self.__slots__:
+        for slot in self.fields:
             setattr(self, slot, None)
 
         for key, val in kwargs.items():
             setattr(self, key, val)
 
     def init(self, **kwargs):
-        for key, val in kwargs.items():
-            if key in self.__slots__:
-                val = self._coerce_type(val)
-                setattr(self, key, val)
+        for key, convert in self._converters:
+            if key in kwargs:
+                setattr(self, key, convert(kwargs[key]))
 
         self._fill_columns()
+        self._nest(kwargs)
     
     def _fill_columns(self):
-        for key, val in self.synonyms.items():
-            if self[key]:
-                setattr(self, val, self[key])
-            elif self[val]:
-                setattr(self, key, self[val])
+        for key, val in self._synonyms:
+            if getattr(self, key):
+                setattr(self, val, getattr(self, key))
+            elif getattr(self, val):
+                setattr(self, key, getattr(self, val))
+
+    def _nest(self, dct) -> None:
+        """
+        Builds the instance's nested models from the same `dct` it was built from.
+        """
+
+        pass
 
     @staticmethod
     def _validate_attr(attr:str) -> str:
@@ -36,37 +127,13 @@ class Model:
 
         return valid_attr
 
-    @staticmethod
-    def _coerce_type(val, separator=","):
+    @classmethod
+    def from_row(cls, row):
         """
-        Coerces `val` as a float or int if applicable,
-        else returns original value.
-
-        :param val: Value to coerce.
+        Builds an instance straight from a database `Row`, which reads like a dictionary.
         """
 
-        if isinstance(val, str):
-            if len(coll := val.split(separator)) > 1:
-                val = [Model._coerce_type(elem.strip()) for elem in coll]
-
-            if val == "True":
-                val = True
-            elif val == "False":
-                val = False
-
-            try:
-                if "." in str(val):
-                    val = float(val)
-                else:
-                    val = int(val)
-            except TypeError: pass
-            except ValueError: pass
-
-        return val
-
-    @classmethod
-    def from_row(cls, row):
-        new_obj = cls.from_dict(row.to_dict())
+        new_obj = cls.from_dict(row)
 
         return new_obj
 
@@ -75,17 +142,71 @@ class Model:
 
     @classmethod
     def from_dict(cls, dct):
+        """
+        Builds an instance from a dictionary, or anything with `get` such as a `Row`,
+            converting each field present exactly once.
+        """
+
+        with metrics.span('model_build', model=cls.__name__):
+            new_obj = cls._from_dict(dct)
+        metrics.inc('models_built_total', model=cls.__name__)
+
+        return new_obj
+
+    @classmethod
+    def _from_dict(cls, dct):
         new_obj = cls()
 
-        for slot in cls.__slots__:
-            val = cls._coerce_type(dct.get(slot, None))
-            if val:
-                setattr(new_obj, cls._validate_attr(slot), val)
+        for field, convert in cls._converters:
+            val = dct.get(field, _MISSING)
+            if val is not _MISSING:
+                setattr(new_obj, field, convert(val))
 
-        new_obj.init(**dct)
+        new_obj._fill_columns()
+        new_obj._nest(dct)
 
         return new_obj
 
+    @classmethod
+    def from_records(cls, records) -> list:
+        """
+        Builds an instance per record.
+        `Row`s sharing a layout hold the same columns, so the fields to read, and where,
+            are worked out once per layout rather than once per record.
+        """
+
+        with metrics.span('model_build', model=cls.__name__):
+            new_objs = cls._from_records(records)
+        metrics.inc('models_built_total', len(new_objs), model=cls.__name__)
+
+        return new_objs
+
+    @classmethod
+    def _from_records(cls, records) -> list:
+        plans = {}
+        new_objs = []
+        for record in records:
+            layout = type(record)
+            index = getattr(layout, '_index', None)
+            if index is None:
+                new_objs.append(cls._from_dict(record))
+                continue
+
+            try:
+                plan = plans[layout]
+            except KeyError:
+                plan = plans[layout] = tuple((field, index[field], convert) for field, convert in cls._converters if field in index)
+
+            new_obj = cls()
+            for field, idx, convert in plan:
+                setattr(new_obj, field, convert(record[idx]))
+
+            new_obj._fill_columns()
+            new_obj._nest(record)
+            new_objs.append(new_obj)
+
+        return new_objs
+
     def to_dict(self, flat=False):
         """
         Returns Model instance as a dictionary.
@@ -135,10 +256,12 @@ class Model:
 
 class User(Model):
     __slots__ = ['user_id', 'user_val', 'name', 'username', 'password']
+    types = {'user_id': int, 'user_val': str, 'name': str, 'username': str, 'password': str}
     synonyms = {'user_val': 'username'}
 
 class Comment(Model):
     __slots__ = ['directory', 'track', 'entered_by', 'caller', 'location', 'sentiment', 'text', 'notes']
+    types = {'directory': str, 'track': int, 'entered_by': str, 'caller': str, 'text': str, 'notes': str}
 
     def __init__(self):
         super().__init__()
@@ -150,43 +273,209 @@ class Comment(Model):
         self.sentiment = None
         self.text = None
 
-    @classmethod
-    def from_dict(cls, dct):
-        new_comment = super().from_dict(dct)
-        new_comment.location = Location.from_dict(dct)
-        new_comment.sentiment = Sentiment.from_dict(dct)
-
-        new_comment.text = dct.get('edited text')
-        if pd.isna(new_comment.text):
-            new_comment.text = dct.get('full text')
+    def _nest(self, dct) -> None:
+        self.location = Location._from_dict(dct)
+        self.sentiment = Sentiment._from_dict(dct)
 
-        return new_comment
+        self.text = dct.get('edited_text')
+        if pd.isna(self.text):
+            self.text = dct.get('full_text')
 
     def __repr__(self): return f"{self.directory}-{self.track} {self.caller}"
 
 class Location(Model):
     __slots__ = ['district', 'neighborhood', 'street', 'city', 'zip', 'zone', 'npu', 'Atlanta', 'other_location']
+    types = {'district': int, 'neighborhood': str, 'street': str, 'city': str, 'zip': int, 'zone': int, 'npu': str, 'Atlanta': bool, 'other_location': str}
 
 class NPU(Model):
     __slots__ = ['npu_id', 'npu_val', 'name', 'neighborhoods']
+    types = {'npu_id': int, 'npu_val': str, 'name': str, 'neighborhoods': list}
     synonyms = {'npu_val': 'name'}
 
 class Zone(Model):
     __slots__ = ['zone_id', 'zone_val', 'neighborhoods']
+    types = {'zone_id': int, 'zone_val': int, 'neighborhoods': list}
 
 class Neighborhood(Model):
     __slots__ = ['neighborhood_id', 'neighborhood_val', 'name', 'npu', 'zone']
+    types = {'neighborhood_id': int, 'neighborhood_val': str, 'name': str}
     synonyms = {'neighborhood_val': 'name'}
 
-    def init(self, **kwargs):
-        super().init(**kwargs)
-        self.npu = NPU.from_dict(kwargs)
-        self.zone = Zone.from_dict(kwargs)
+    def _nest(self, dct) -> None:
+        self.npu = NPU._from_dict(dct)
+        self.zone = Zone._from_dict(dct)
 
 class District(Model):
     __slots__ = ['district_id', 'district_val', 'councilor']
+    types = {'district_id': int, 'district_val': int, 'councilor': str}
 
 class Sentiment(Model):
     __slots__ = ['topic', 'intent']
+    types = {'topic': str, 'intent': str}
 
     def __repr__(self): return f"{self.topic}: {self.intent}"
+
+
+class ModelView:
+    """
+    A read-only stand-in for an instance of `model` over one row of a `CommentBatch`.
+    Fields are read from the batch's arrays when accessed instead of being copied into an instance.
+    """
+
+    __slots__ = ['batch', 'position', 'model']
+
+    def __init__(self, batch, position:int, model:type):
+        self.batch = batch
+        self.position = position
+        self.model = model
+
+    def __getattr__(self, attr):
+        try:
+            convert = self.model._convert[attr]
+        except KeyError:
+            raise AttributeError(attr) from None
+
+        return convert(self.batch.value(attr, self.position))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_model(self) -> Model:
+        """
+        Copies the row into an instance of `model`.
+        """
+
+        return self.model.from_dict(self.batch.record(self.position))
+
+    def __repr__(self): return f"{self.model.__name__}View: {self.batch.record(self.position)}"
+
+class CommentView(ModelView):
+    __slots__ = []
+
+    def __init__(self, batch, position:int):
+        super().__init__(batch, position, Comment)
+
+    @property
+    def location(self) -> ModelView: return ModelView(self.batch, self.position, Location)
+
+    @property
+    def sentiment(self) -> ModelView: return ModelView(self.batch, self.position, Sentiment)
+
+    @property
+    def text(self) -> str:
+        text = _to_str(self.batch.value('edited_text', self.position))
+        if text is None:
+            text = _to_str(self.batch.value('full_text', self.position))
+
+        return text
+
+    def __repr__(self): return f"{self.directory}-{self.track} {self.caller}"
+
+class CommentBatch:
+    """
+    Many comments held column by column, for reports over a whole meeting.
+    Location and intent columns are stored as categorical codes,
+        so counting comments per category is a `np.bincount` rather than a loop over `Comment` instances.
+    """
+
+    categorical = ('district', 'npu', 'zone', 'neighborhood', 'intent')
+
+    def __init__(self, frame:pd.DataFrame):
+        """
+        :param frame: DataFrame with the comments table's columns.
+        """
+
+        frame = frame.reset_index(drop=True)
+        for col in self.categorical:
+            if col in frame.columns and not isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = self._categorize(frame[col])
+
+        self.frame = frame
+        self._codes = {col: (frame[col].cat.codes.to_numpy(), frame[col].cat.categories.to_numpy()) for col in self.categorical if col in frame.columns}
+        self._arrays = {col: frame[col].to_numpy() for col in frame.columns if col not in self._codes}
+
+    @staticmethod
+    def _categorize(series:pd.Series) -> pd.Series:
+        """
+        Returns `series` as a categorical; whole-number floats, which a column of ints with gaps is read as, become ints.
+        """
+
+        if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+            series = series.astype('Int64')
+
+        return series.astype('category')
+
+    def __len__(self): return len(self.frame)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield CommentView(self, position)
+
+    def __getitem__(self, key):
+        """
+        Returns a `CommentView` for an int,
+            else a new batch of the rows selected by a slice, boolean mask or array of positions.
+        """
+
+        if isinstance(key, (int, np.integer)):
+            if not -len(self) <= key < len(self):
+                raise IndexError(key)
+            return CommentView(self, key % len(self))
+
+        return CommentBatch(self.frame.iloc[key])
+
+    def value(self, column:str, position:int):
+        """
+        Returns the value of `column` in the row at `position`, or None if there is none.
+        """
+
+        try:
+            codes, categories = self._codes[column]
+        except KeyError:
+            values = self._arrays.get(column)
+            return None if values is None else values[position]
+
+        code = codes[position]
+        return None if code < 0 else categories[code]
+
+    def record(self, position:int) -> dict:
+        return {col: self.value(col, position) for col in self.frame.columns}
+
+    def codes(self, column:str) -> tuple:
+        """
+        Returns the codes of a categorical `column`, -1 where missing, and the categories they index.
+        """
+
+        return self._codes[column]
+
+    def count(self, by:str, of:str=None):
+        """
+        Counts comments per category of `by`, skipping missing values.
+
+        :param by: Categorical column to group by.
+        :param of: Categorical column to break each group down by, e.g. intent per district.
+        :return: Series of counts indexed by `by`'s categories, or with `of`,
+            DataFrame of counts with a row per category of `by` and a column per category of `of`.
+        """
+
+        by_codes, by_categories = self.codes(by)
+        if of is None:
+            counts = np.bincount(by_codes[by_codes >= 0], minlength=len(by_categories))
+            return pd.Series(counts, index=pd.Index(by_categories, name=by), name='count')
+
+        of_codes, of_categories = self.codes(of)
+        present = (by_codes >= 0) & (of_codes >= 0)
+        pairs = by_codes[present].astype(np.int64) * len(of_categories) + of_codes[present]
+        counts = np.bincount(pairs, minlength=len(by_categories) * len(of_categories))
+
+        return pd.DataFrame(
+            counts.reshape(len(by_categories), len(of_categories)),
+            index=pd.Index(by_categories, name=by),
+            columns=pd.Index(of_categories, name=of)
+        )
+
+    def to_comments(self) -> list:
+        return [view.to_model() for view in self]
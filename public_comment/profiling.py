@@ -0,0 +1,135 @@
+import cProfile
+import datetime
+from flask import abort, Blueprint, current_app, Flask, g, make_response, render_template, request, send_from_directory
+import functools
+import io
+import os
+import pstats
+import time
+import uuid
+
+from public_comment.const import *
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = 'profile'
+
+bp = Blueprint('profiling', __name__, url_prefix='/profiles')
+
+
+def init_app(app:Flask) -> None:
+    """
+    If `PROFILING` is set, wraps every view so admins can profile a single request,
+        and serves the captured profiles at /profiles/.
+    Call after every blueprint is registered. When `PROFILING` is off nothing is installed.
+    """
+
+    if not app.config['PROFILING']:
+        return
+
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint != 'static':
+            app.view_functions[endpoint] = profiled(view)
+
+    app.register_blueprint(bp)
+
+
+def is_admin() -> bool:
+    user = g.get('user')
+
+    return user is not None and user[USER_VAL] in current_app.config['PROFILING_ADMINS']
+
+def requested() -> bool:
+    """
+    Checks if the request asks to be profiled, by header or query argument, and comes from an admin.
+    """
+
+    flag = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+
+    return bool(flag) and flag != '0' and is_admin()
+
+
+def profiled(view):
+    """
+    Runs `view` under cProfile when the request asks for it, saving the profile under PROFILE_DIR.
+    The response names the capture in its X-Profile-Id header.
+    """
+
+    @functools.wraps(view)
+    def wrapped_view(*args, **kwargs):
+        if not requested():
+            return view(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            response = make_response(profiler.runcall(view, *args, **kwargs))
+        finally:
+            capture = save(profiler, time.perf_counter() - start)
+
+        response.headers['X-Profile-Id'] = capture
+        return response
+
+    return wrapped_view
+
+
+def save(profiler:cProfile.Profile, elapsed:float) -> str:
+    """
+    Writes the profile of the current request to PROFILE_DIR:
+        `<capture>.prof`, the full call graph readable by pstats, snakeviz or gprof2dot,
+        and `<capture>.txt`, the top PROFILE_TOP functions by cumulative time and their callers.
+
+    :return: Name of the capture.
+    """
+
+    directory = current_app.config['PROFILE_DIR']
+    top = current_app.config['PROFILE_TOP']
+    capture = "{time}-{endpoint}-{id}".format(
+        time=datetime.datetime.now().strftime('%Y%m%d-%H%M%S'),
+        endpoint=(request.endpoint or 'unknown').replace('.', '-'),
+        id=uuid.uuid4().hex[:6]
+    )
+
+    profiler.dump_stats(os.path.join(directory, f"{capture}.prof"))
+
+    report = io.StringIO()
+    report.write(f"{request.method} {request.full_path.rstrip('?')}\n")
+    report.write(f"user: {g.user[USER_VAL]}\n")
+    report.write(f"elapsed: {elapsed * 1000:.1f} ms\n\n")
+    stats = pstats.Stats(profiler, stream=report).sort_stats('cumulative')
+    stats.print_stats(top)
+    stats.print_callers(top)
+    with open(os.path.join(directory, f"{capture}.txt"), 'w') as f:
+        f.write(report.getvalue())
+
+    return capture
+
+
+def captures(limit:int=50) -> list:
+    """
+    Returns the most recent captures, newest first, as (name, captured at, size of the .prof in bytes).
+    """
+
+    directory = current_app.config['PROFILE_DIR']
+    found = []
+    for entry in os.scandir(directory):
+        name, extension = os.path.splitext(entry.name)
+        if extension == '.prof':
+            stat = entry.stat()
+            found.append((name, datetime.datetime.fromtimestamp(stat.st_mtime), stat.st_size))
+
+    return sorted(found, key=lambda capture: capture[1], reverse=True)[:limit]
+
+
+@bp.before_request
+def admins_only():
+    if not is_admin():
+        abort(403)
+
+@bp.route('/', methods=(GET,))
+def index():
+    return render_template('profiles.html', captures=captures())
+
+@bp.route('/<string:capture>.<any(txt, prof):extension>', methods=(GET,))
+def download(capture:str, extension:str):
+    return send_from_directory(current_app.config['PROFILE_DIR'], f"{capture}.{extension}", as_attachment=extension == 'prof')
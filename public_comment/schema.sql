@@ -3,6 +3,11 @@ DROP TABLE IF EXISTS npus;
 DROP TABLE IF EXISTS zones;
 DROP TABLE IF EXISTS districts;
 DROP TABLE IF EXISTS neighborhoods;
+DROP TABLE IF EXISTS comments;
+DROP TABLE IF EXISTS queue;
+DROP TABLE IF EXISTS keywords;
+DROP TABLE IF EXISTS keywords_version;
+DROP TABLE IF EXISTS jobs;
 
 CREATE TABLE users (
     user_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -305,4 +310,135 @@ INSERT INTO neighborhoods (neighborhood_val, npu_id, zone_id)
         ('South River Gardens', 25, 3),
         ('Swallow Circle/Baywood', 25, NULL),
         ('Thomasville Heights', 25 , 3)
-;
\ No newline at end of file
+;
+
+CREATE TABLE comments (
+    directory TEXT NOT NULL,
+    track INTEGER NOT NULL,
+    time TEXT,
+    overall_time TEXT,
+    link TEXT,
+    filename TEXT,
+    otter_timestamp TEXT,
+    entered_by TEXT,
+    caller TEXT,
+    county TEXT,
+    city TEXT,
+    neighborhood TEXT,
+    district INTEGER,
+    councilor TEXT,
+    zone INTEGER,
+    npu TEXT,
+    zip INTEGER,
+    street TEXT,
+    Atlanta INTEGER,
+    other_location TEXT,
+    topic TEXT,
+    intent TEXT,
+    full_text TEXT,
+    edited_text TEXT,
+    notes TEXT,
+    PRIMARY KEY (directory, track)
+) WITHOUT ROWID;
+
+CREATE INDEX comments_entered_by ON comments (entered_by);
+CREATE INDEX comments_district ON comments (district);
+CREATE INDEX comments_npu ON comments (npu);
+CREATE INDEX comments_zone ON comments (zone);
+CREATE INDEX comments_intent ON comments (intent);
+
+CREATE TABLE queue (
+    directory TEXT NOT NULL,
+    track INTEGER NOT NULL,
+    claimed_by TEXT,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (directory, track)
+) WITHOUT ROWID;
+
+CREATE INDEX queue_lease_expires ON queue (lease_expires);
+CREATE INDEX queue_claimed_by ON queue (claimed_by);
+
+CREATE TABLE jobs (
+    job_id TEXT NOT NULL PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    header INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL,
+    message TEXT,
+    rows INTEGER,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+
+-- sentiment '' marks keywords that are only highlighted in the form
+CREATE TABLE keywords (
+    keyword_val TEXT NOT NULL,
+    sentiment TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (keyword_val, sentiment)
+) WITHOUT ROWID;
+
+-- bumped on every change to keywords, so compiled matchers know when to rebuild
+CREATE TABLE keywords_version (
+    version INTEGER NOT NULL
+);
+
+INSERT INTO keywords_version (version) VALUES (0);
+
+CREATE TRIGGER keywords_inserted AFTER INSERT ON keywords
+    BEGIN UPDATE keywords_version SET version = version + 1; END;
+CREATE TRIGGER keywords_updated AFTER UPDATE ON keywords
+    BEGIN UPDATE keywords_version SET version = version + 1; END;
+CREATE TRIGGER keywords_deleted AFTER DELETE ON keywords
+    BEGIN UPDATE keywords_version SET version = version + 1; END;
+
+INSERT INTO keywords (keyword_val, sentiment)
+    VALUES
+        ('defund', 'defund'),
+        ('defunding', 'defund'),
+        ('divest', 'defund'),
+        ('allocate', 'defund'),
+        ('allocation', 'defund'),
+        ('reallocate', 'defund'),
+        ('reallocation', 'defund'),
+        ('funds', 'defund'),
+        ('funding', 'defund'),
+        ('budget', 'defund'),
+        ('reform', 'reform'),
+        ('training', 'reform'),
+        ('abolish', 'abolish'),
+        ('dismantle', 'abolish'),
+        ('blue', 'support'),
+        ('prison', 'prison'),
+        ('jail', 'prison'),
+        ('jails', 'prison'),
+        ('community', 'communities'),
+        ('communities', 'communities'),
+        ('social', 'communities'),
+        ('education', 'education'),
+        ('school', 'education'),
+        ('schools', 'education'),
+        ('teacher', 'education'),
+        ('teachers', 'education'),
+        ('teaching', 'education'),
+        ('insurance', 'healthcare'),
+        ('medical', 'healthcare'),
+        ('healthcare', 'healthcare'),
+        ('medicine', 'healthcare'),
+        ('medication', 'healthcare'),
+        ('afford', ''),
+        ('arrest', ''),
+        ('city', ''),
+        ('civil', ''),
+        ('criminal', ''),
+        ('homeless', ''),
+        ('npu', ''),
+        ('officer', ''),
+        ('police', ''),
+        ('policing', ''),
+        ('private', ''),
+        ('property', ''),
+        ('public', ''),
+        ('replace', ''),
+        ('victim', ''),
+        ('zone', '')
+;
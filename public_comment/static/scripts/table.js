@@ -0,0 +1,79 @@
+// Fetches the review table a page at a time as the #more marker scrolls into view.
+const filters = document.getElementById('filters');
+const rows = document.getElementById('rows');
+const more = document.getElementById('more');
+const columns = ['directory', 'track', 'entered_by', 'caller', 'district', 'neighborhood', 'zone', 'npu', 'topic', 'intent', 'excerpt'];
+
+let next = {};
+let loading = false;
+// bumped whenever the filters change, so pages requested under the old filters are dropped
+let generation = 0;
+
+function query() {
+    const params = new URLSearchParams({limit: filters.dataset.limit});
+    for (const select of filters.querySelectorAll('select')) {
+        if (select.value !== '-') {
+            params.set(select.name, select.value);
+        }
+    }
+    for (const [key, value] of Object.entries(next)) {
+        params.set(key, value);
+    }
+
+    return `${filters.dataset.rows}?${params}`;
+}
+
+async function load() {
+    if (loading || next === null) {
+        return;
+    }
+
+    loading = true;
+    const requested = generation;
+    try {
+        const response = await fetch(query());
+        if (!response.ok) {
+            throw new Error(`${response.status} ${response.statusText}`);
+        }
+        const page = await response.json();
+
+        if (requested === generation) {
+            for (const row of page.rows) {
+                const tr = document.createElement('tr');
+                for (const column of columns) {
+                    const td = document.createElement('td');
+                    td.textContent = row[column] === null ? '' : row[column];
+                    tr.appendChild(td);
+                }
+                rows.appendChild(tr);
+            }
+            next = page.next;
+        }
+    } catch (error) {
+        if (requested === generation) {
+            next = null;
+            more.textContent = `Couldn't load comments: ${error.message}`;
+        }
+    } finally {
+        loading = false;
+    }
+
+    // start over if the filters changed while this page loaded, else keep loading while the marker is on screen
+    if (requested !== generation || (next !== null && more.getBoundingClientRect().top < window.innerHeight)) {
+        load();
+    }
+}
+
+filters.addEventListener('change', () => {
+    generation += 1;
+    rows.innerHTML = '';
+    more.textContent = '';
+    next = {};
+    load();
+});
+
+new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) {
+        load();
+    }
+}).observe(more);
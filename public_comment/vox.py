@@ -1,6 +1,9 @@
-from flask import Blueprint, redirect, render_template, request, url_for
+from flask import Blueprint, current_app, g, jsonify, redirect, render_template, request, Response, session, url_for
+import io
 import json
+import uuid
 
+from public_comment.auth import login_required
 from public_comment.const import *
 from public_comment.data import VoxPopuli
 from public_comment.db import DataManager
@@ -10,49 +13,113 @@ bp = Blueprint('vox', __name__)
 vp = VoxPopuli()
 dm = DataManager()
 
+SESSION_CHECK = 'session'
+INTENTS = ["For Police (Support Budget)", "Defund Police (Amend Budget)", "Other"]
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
 @bp.route('/')
 def index():
     return render_template('index.html')
 
 @bp.route('/table/', methods=(GET,))
 def table():
-    table = None        
+    """
+    Review table; rows are fetched page by page from `table_rows` as the reviewer scrolls.
+    """
+
+    return render_template('table.html', districts=dm.get_districts(), zones=dm.get_zones(), npus=dm.get_npus(), intents=INTENTS, limit=PAGE_SIZE)
+
+@bp.route('/table/rows', methods=(GET,))
+def table_rows():
+    """
+    Returns a page of comments as JSON, in (directory, track) order.
+
+    Query arguments:
+        limit: Rows per page, at most MAX_PAGE_SIZE.
+        order: 'asc' or 'desc'.
+        after_directory, after_track: Key of the last row of the previous page, as given by 'next'.
+        entered_by, district, npu, zone, intent: Values to filter on; left empty, matches comments without one.
+    """
+
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    descending = request.args.get('order', 'asc') == 'desc'
+
+    after = None
+    if request.args.get('after_directory') is not None:
+        after = (request.args['after_directory'], request.args.get('after_track', type=int))
+        if after[1] is None:
+            return jsonify(error="after_track must be an integer."), 400
 
-    return render_template('table.html', table=table)
+    filters = {col: request.args[col] or None for col in dm.page_filters if col in request.args}
+
+    rows = dm.page_comments(filters, after=after, limit=limit + 1, descending=descending)
+    page = [row.to_dict() for row in rows[:limit]]
+    next_key = {'after_directory': page[-1][DIRECTORY], 'after_track': page[-1][TRACK]} if len(rows) > limit else None
+
+    return jsonify(rows=page, next=next_key)
+
+@bp.route('/table/export', methods=(GET,))
+def export_table():
+    buffer = io.BytesIO()
+    vp.table.to_excel(buffer, index=False)
+
+    return Response(
+        buffer.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': 'attachment; filename="public comment.xlsx"'}
+    )
 
 @bp.route('/load_table', methods=(POST,))
+@login_required
 def load_table():
-    vp.table = {
-        'sheet': request.files['spreadsheet'],
-        'header': request.form['header']
-    }
+    """
+    Queues the uploaded spreadsheet for import and returns the import job's id right away.
+    """
 
-    return redirect(url_for('vox.form'))
+    spreadsheet = request.files.get('spreadsheet')
+    if not spreadsheet:
+        return jsonify(error="No spreadsheet uploaded."), 400
+
+    try:
+        job_id = vp.upload(spreadsheet, request.form.get('header', 0))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    job_url = url_for('vox.job', job_id=job_id)
+
+    return jsonify(job_id=job_id, status=QUEUED, url=job_url), 202, {'Location': job_url}
+
+@bp.route('/jobs/<string:job_id>', methods=(GET,))
+def job(job_id:str):
+    job = dm.get_job(job_id)
+    if job is None:
+        return jsonify(error="No such job."), 404
+
+    return jsonify({key: val for key, val in job.items() if key != 'file_path'})
 
 @bp.route('/form/', methods=[GET])
 @bp.route('/form/<string:directory>/<int:track>', methods=[GET])
 def form(directory:str=None, track:int=None):
-    from flask import current_app
-    import os
-    sheet = os.path.join(current_app.instance_path, 'Full Council 2020-07-06.xlsx')
-    if not vp.table is not None:
-        vp.table = {'sheet': sheet, 'header': 2}
+    if not directory and claimant() is None and not request.args.get(SESSION_CHECK):
+        # come back with the session cookie just set, to lease a comment under it
+        return redirect(url_for('vox.form', **{SESSION_CHECK: 1}))
 
-    table = vp.table
-    row = vp.get_series(table, directory, track)
-    comment = Comment.from_dict(row.to_dict())
+    comment = vp.get_comment(directory, track, claimant=claimant())
+    if comment is None and not directory:
+        vp.load(current_app.config['WORKBOOK'], header=current_app.config['WORKBOOK_HEADER'])
+        comment = vp.get_comment(claimant=claimant())
 
     districts = dm.get_districts()  # ['Carla Smith', 'Amir R. Farokhi', 'Antonio Brown', 'Cleta Winslow', 'Natalyn Archibong', 'Jennifer N. Ide', 'Howard Shook', 'J. P. Matzigkeit', 'Dustin Hillis', 'Andrea L. Boone', 'Marci Collier Overstreet', 'Joyce Sheperd']
-    # TODO easier way to update keywords
-    keywords = ['afford', 'arrest', 'city', 'civil', 'community', 'criminal', 'defund', 'dismantle', 'homeless', 'jail', 'npu', 'officer', 'police', 'policing', 'prison', 'private', 'property', 'public' 'reallocate', 'reform', 'replace', 'school', 'training', 'victim', 'zone']
     cities = []
     counties = []
-    neighborhoods = sorted(dm.get_neighborhoods(), key=lambda neighborhood: neighborhood.name)
+    neighborhoods = dm.get_neighborhoods()
     zones = dm.get_zones()
     npus = dm.get_npus()
-    intents = ["For Police (Support Budget)", "Defund Police (Amend Budget)", "Other"] 
+    intents = INTENTS
+
+    transcript = dm.get_matcher(stems=True, highlight=True).highlight(comment.text) if comment else []
 
-    return render_template('form.html', keywords=keywords, comment=comment, intents=intents, districts=districts, zones=zones, neighborhoods=neighborhoods)
+    return render_template('form.html', transcript=transcript, comment=comment, intents=intents, districts=districts, zones=zones, neighborhoods=neighborhoods)
 
 @bp.route('/form/<string:directory>/<int:track>', methods=[POST])
 def acknowledge(directory:str, track:int):
@@ -60,3 +127,28 @@ def acknowledge(directory:str, track:int):
     vp.update_table(acknowledged_comment)
     
     return redirect(url_for('vox.form', directory=directory, track=track))
+
+@bp.route('/form/<string:directory>/<int:track>/release', methods=[POST])
+def release(directory:str, track:int):
+    vp.release(directory, track, claimant())
+
+    return redirect(url_for('vox.form'))
+
+def claimant() -> str:
+    """
+    Identifies who comments are leased to: the logged-in user, else a random token kept in the session,
+        since volunteers behind the same router share an address.
+    Returns None for the rest of the request when the client didn't send a token back, as crawlers and health checks don't,
+        so they can't lease comments; the token is set for its next request.
+    """
+
+    if 'claimant' not in g:
+        if g.user:
+            g.claimant = g.user[USER_VAL]
+        elif CLAIMANT in session:
+            g.claimant = f"anonymous:{session[CLAIMANT]}"
+        else:
+            session[CLAIMANT] = uuid.uuid4().hex
+            g.claimant = None
+
+    return g.claimant
@@ -0,0 +1,34 @@
+import pytest
+
+from public_comment import create_app
+from public_comment.const import *
+from public_comment.db import DataManager
+from public_comment.vox import vp
+
+COMMENT_COUNT = 5
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'DATABASE': str(tmp_path / 'db.sqlite'),
+        'WORKBOOK_CACHE': str(tmp_path / 'workbooks.sqlite'),
+        'UPLOAD_DIR': str(tmp_path / 'uploads')
+    })
+    vp._buffer = vp._cache = vp._ingester = None
+
+    with app.app_context():
+        dm = DataManager()
+        dm.init_db()
+        dm.import_comments([DIRECTORY, TRACK, FULL_TEXT], [('FC-1', track, f"Comment number {track}.") for track in range(1, COMMENT_COUNT + 1)])
+
+    yield app
+
+    if vp._buffer is not None:
+        vp._buffer.flush()
+    vp._buffer = vp._cache = vp._ingester = None
+
+@pytest.fixture
+def dm(app):
+    with app.app_context():
+        yield DataManager()
@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+import pytest
+
+import analysis
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'Full Council 2020-07-06.xlsx')
+HEADER = 2
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    analyzer = analysis.Analyzer(WORKBOOK, header=HEADER)
+    yield analyzer
+    analyzer.close()
+
+@pytest.fixture(scope='module')
+def tagged(analyzer):
+    return analyzer.level_0(analyzer.load_table())
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx', '.parquet', '.feather'])
+def test_save_table_writes_each_format(analyzer, tagged, tmp_path, extension):
+    if extension in ('.parquet', '.feather'):
+        pytest.importorskip('pyarrow')
+
+    output = str(tmp_path / f"lvl0{extension}")
+    analyzer.save_table(tagged, output)
+    written = analyzer.load_file(output)
+
+    assert len(written) == len(tagged)
+    assert list(written.columns) == list(tagged.columns)
+    assert written['defund'].sum() == tagged['defund'].sum()
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.feather'])
+def test_save_table_from_csv(analyzer, tagged, tmp_path, extension):
+    pytest.importorskip('pyarrow')
+
+    source = str(tmp_path / "comments.csv")
+    analyzer.save_table(analyzer.load_table(), source)
+    from_csv = analysis.Analyzer(source)
+    output = str(tmp_path / f"lvl0{extension}")
+    from_csv.calc_level_0(output)
+
+    assert len(from_csv.load_file(output)) == len(tagged)
+
+
+def test_registered_formats_are_tested():
+    assert set(analysis.Analyzer(WORKBOOK).extension_functions) == {'.csv', '.xlsx', '.parquet', '.feather'}
+
+
+def test_update_level_0_after_calc_level_0(analyzer, tagged, tmp_path):
+    output = str(tmp_path / "lvl0.csv")
+    analyzer.calc_level_0(output)
+    analyzer.update_level_0(output)
+    first = analyzer.load_file(output)
+    signature = analyzer.file_signature(output)
+    analyzer.update_level_0(output)
+
+    assert analyzer.file_signature(output) == signature
+    assert len(first) == len(tagged)
+    assert first['defund'].sum() == tagged['defund'].sum()
+
+
+def test_update_level_0_keeps_existing_tags(analyzer, tmp_path):
+    source = analyzer.load_table().head(20).drop(columns=['other']).assign(**{'entered by': None})
+    for sentiment in analysis.SENTIMENTS:
+        source[sentiment] = None
+    source.loc[0, ['reform', 'other', 'entered by']] = [True, True, 'Kyle']
+    source_path = str(tmp_path / "comments.csv")
+    source.to_csv(source_path, index=False)
+
+    tagger = analysis.Analyzer(source_path, matcher=analyzer.matcher)
+    tagger.update_level_0(str(tmp_path / "incremental.csv"))
+    tagger.calc_level_0(str(tmp_path / "full.csv"))
+    incremental = tagger.load_file(str(tmp_path / "incremental.csv"))
+
+    assert incremental.loc[0, 'entered by'] == 'Kyle'
+    assert bool(incremental.loc[0, 'reform']) and pd.isna(incremental.loc[0, 'defund'])
+    assert (incremental.loc[1:, 'entered by'] == 'lvl_0').all()
+    pd.testing.assert_frame_equal(incremental, tagger.load_file(str(tmp_path / "full.csv")))
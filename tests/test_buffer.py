@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+from unittest import mock
+
+from public_comment.const import *
+from public_comment.data import WriteBuffer
+from public_comment.db import DataManager
+
+
+def edit(track:int, **values) -> dict:
+    return {DIRECTORY: 'FC-1', TRACK: track, **values}
+
+def stored(dm, track:int, col:str):
+    return dm.fetch(f"SELECT {col} FROM {COMMENTS} WHERE {DIRECTORY} = ? AND {TRACK} = ?", ('FC-1', track))[0][col]
+
+
+def test_repeated_edits_are_merged(app, dm):
+    buffer = WriteBuffer(app, size=10, interval=60)
+    buffer.put(edit(1, caller="Ann", notes="first"))
+    buffer.put(edit(1, notes="second"))
+
+    assert buffer.keys() == {('FC-1', 1)}
+    assert stored(dm, 1, 'caller') is None
+
+    buffer.flush()
+
+    assert buffer.keys() == set()
+    assert stored(dm, 1, 'caller') == "Ann"
+    assert stored(dm, 1, 'notes') == "second"
+
+def test_full_buffer_flushes(app, dm):
+    buffer = WriteBuffer(app, size=2, interval=60)
+    buffer.put(edit(1, caller="Ann"))
+    buffer.put(edit(2, caller="Bob"))
+
+    assert buffer.keys() == set()
+    assert stored(dm, 2, 'caller') == "Bob"
+
+def test_failed_flush_keeps_edits_beneath_newer(app, dm):
+    buffer = WriteBuffer(app, size=10, interval=60)
+    buffer.put(edit(1, caller="Ann", notes="first"))
+
+    with mock.patch.object(DataManager, 'update_comments', side_effect=sqlite3.OperationalError("database is locked")):
+        buffer.flush()
+
+    buffer.put(edit(1, notes="second"))
+    assert buffer.get('FC-1', 1) == edit(1, caller="Ann", notes="second")
+
+    buffer.flush()
+
+    assert stored(dm, 1, 'caller') == "Ann"
+    assert stored(dm, 1, 'notes') == "second"
+
+def test_flushes_do_not_overlap(app, dm):
+    buffer = WriteBuffer(app, size=10, interval=60)
+    update_comments = DataManager.update_comments
+    writing, proceed = threading.Event(), threading.Event()
+
+    def slow_first_write(self, comments):
+        if not writing.is_set():
+            writing.set()
+            proceed.wait(5)
+        update_comments(self, comments)
+
+    with mock.patch.object(DataManager, 'update_comments', slow_first_write):
+        buffer.put(edit(1, caller="older"))
+        first = threading.Thread(target=buffer.flush)
+        first.start()
+        writing.wait(5)
+
+        buffer.put(edit(1, caller="newer"))
+        second = threading.Thread(target=buffer.flush)
+        second.start()
+        second.join(0.2)
+
+        proceed.set()
+        first.join()
+        second.join()
+
+    assert stored(dm, 1, 'caller') == "newer"
@@ -0,0 +1,11 @@
+import pandas as pd
+
+from public_comment.matcher import KeywordMatcher
+
+
+def test_tag_counts_past_255_keywords():
+    keywords = [f"word{idx:03d}" for idx in range(300)]
+    matcher = KeywordMatcher({'many': keywords[:256], 'few': keywords[256:]})
+    texts = pd.Series([" ".join(keywords[:256]), "word299", None])
+
+    assert matcher.tag(texts).tolist() == [[True, False], [False, True], [False, False]]
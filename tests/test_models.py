@@ -0,0 +1,12 @@
+import pytest
+
+from public_comment.models import Location
+
+
+@pytest.mark.parametrize('zip_code, expected', [('30303', 30303), (' 30303 ', 30303), ('30303.0', 30303), (30303.0, 30303), ('', None), ('abc', None), ('30303.5', None)])
+def test_int_fields(zip_code, expected):
+    assert Location.from_dict({'zip': zip_code}).zip == expected
+
+@pytest.mark.parametrize('atlanta, expected', [('yes', True), (' No ', False), (1, True), ('', None), ('maybe', None), (None, None)])
+def test_bool_fields(atlanta, expected):
+    assert Location.from_dict({'Atlanta': atlanta}).Atlanta is expected
@@ -0,0 +1,75 @@
+import re
+
+from public_comment.const import *
+from public_comment.vox import vp
+
+
+def lease_expires(dm, key:tuple) -> float:
+    return dm.fetch(f"SELECT {LEASE_EXPIRES} FROM {QUEUE} WHERE {DIRECTORY} = ? AND {TRACK} = ?", key)[0][LEASE_EXPIRES]
+
+
+def test_claimants_get_different_comments(dm):
+    assert dm.claim_comment('a', 60) == ('FC-1', 1)
+    assert dm.claim_comment('b', 60) == ('FC-1', 2)
+
+def test_claim_renews_held_lease(dm):
+    key = dm.claim_comment('a', 60)
+    expires = lease_expires(dm, key)
+
+    assert dm.claim_comment('a', 120) == key
+    assert lease_expires(dm, key) > expires
+
+def test_claim_skips_excluded(dm):
+    key = dm.claim_comment('a', 60)
+
+    assert dm.claim_comment('a', 60, exclude={key}) == ('FC-1', 2)
+
+def test_released_comment_goes_behind_unclaimed(dm):
+    key = dm.claim_comment('a', 60)
+    dm.release_comment(*key, 'a')
+
+    assert [dm.claim_comment(claimant, 60) for claimant in 'bcde'] == [('FC-1', 2), ('FC-1', 3), ('FC-1', 4), ('FC-1', 5)]
+    assert dm.claim_comment('f', 60) == key
+
+def test_release_needs_the_lease(dm):
+    key = dm.claim_comment('a', 60)
+    dm.release_comment(*key, 'b')
+
+    assert dm.claim_comment('b', 60) != key
+
+def test_expired_lease_is_claimed_again(dm):
+    keys = [dm.claim_comment(claimant, 60) for claimant in 'abde']
+    lapsed = dm.claim_comment('c', -1)
+
+    assert lapsed not in keys
+    assert dm.claim_comment('f', 60) == lapsed
+
+def test_empty_queue(dm):
+    for claimant in 'abcde':
+        dm.claim_comment(claimant, 60)
+
+    assert dm.claim_comment('f', 60) is None
+    assert dm.peek_comment() is None
+
+
+def form_key(page) -> tuple:
+    return re.search(r'action="/form/([^/"]+)/(\d+)"', page.data.decode()).groups()
+
+def test_anonymous_volunteer_moves_on_after_submitting(app):
+    client = app.test_client()
+    tracks = []
+    for _ in range(4):
+        directory, track = form_key(client.get('/form/', follow_redirects=True))
+        tracks.append(track)
+        client.post(f"/form/{directory}/{track}", data={DIRECTORY: directory, TRACK: track, ENTERED_BY: '', 'intent': 'Other'})
+        with app.app_context():
+            vp.buffer.flush()
+
+    assert tracks == ['1', '2', '3', '4']
+
+def test_cookieless_clients_lease_nothing(app, dm):
+    client = app.test_client(use_cookies=False)
+    for _ in range(3):
+        assert form_key(client.get('/form/', follow_redirects=True)) == ('FC-1', '1')
+
+    assert not dm.fetch(f"SELECT 1 FROM {QUEUE} WHERE {LEASE_EXPIRES} > 0")
@@ -0,0 +1,26 @@
+import os
+import sqlite3
+
+from werkzeug.datastructures import FileStorage
+
+from public_comment.const import *
+from public_comment.vox import vp
+
+from conftest import COMMENT_COUNT
+
+WORKBOOK = os.path.join(os.path.dirname(__file__), '..', 'instance', 'Full Council 2020-07-06.xlsx')
+
+
+def test_upload_is_imported_without_caching(app, dm):
+    with open(WORKBOOK, 'rb') as f:
+        job_id = vp.upload(FileStorage(f, filename='upload.xlsx'), header=2)
+    vp.ingester.executor.shutdown(wait=True)
+
+    job = dm.get_job(job_id)
+    assert job[STATUS] == DONE
+    assert dm.count_comments() > COMMENT_COUNT
+    assert os.listdir(app.config['UPLOAD_DIR']) == []
+
+    if os.path.exists(app.config['WORKBOOK_CACHE']):
+        with sqlite3.connect(app.config['WORKBOOK_CACHE']) as cache:
+            assert cache.execute("SELECT name FROM sqlite_master WHERE name LIKE 'sheet\\_%' ESCAPE '\\'").fetchall() == []